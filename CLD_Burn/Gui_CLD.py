@@ -108,6 +108,7 @@ class StartCldDialog(tkinter.simpledialog.Dialog):
         :param max_current=12
         :param shunt=0.0256
         :param pw=None
+        :param search=False
         """
 
         root = tk.Tk()
@@ -120,7 +121,7 @@ class StartCldDialog(tkinter.simpledialog.Dialog):
 
         return r
 
-    def __init__(self, parent, *, voltage=50, max_current=12, shunt=0.0256, pw=None):
+    def __init__(self, parent, *, voltage=50, max_current=12, shunt=0.0256, pw=None, search=False):
         pw = pw or [10, 30, 100, 300, 1000]
         pw = ','.join([str(p) for p in pw])
 
@@ -128,6 +129,7 @@ class StartCldDialog(tkinter.simpledialog.Dialog):
         self.max_current = tk.StringVar(value=str(max_current))
         self.shunt = tk.StringVar(value=str(shunt))
         self.pw = tk.StringVar(value=pw)
+        self.search = tk.BooleanVar(value=search)
 
         self.start_exec = False
 
@@ -157,6 +159,10 @@ class StartCldDialog(tkinter.simpledialog.Dialog):
         ttk.Entry(master, textvariable=self.pw) \
             .grid(row=3, column=1, columnspan=2)
 
+        ttk.Checkbutton(master, text="Search the burn width (between the first and last pulse)",
+                        variable=self.search, onvalue=True, offvalue=False) \
+            .grid(row=4, column=0, columnspan=3, sticky=tk.W)
+
     def buttonbox(self):
 
         box = tk.Frame(self)
@@ -183,7 +189,8 @@ class StartCldDialog(tkinter.simpledialog.Dialog):
                 return dict(voltage=float(self.voltage.get()),
                             max_current=float(self.max_current.get()),
                             shunt=float(self.shunt.get()),
-                            pw=[int(p) for p in self.pw.get().split(',')])
+                            pw=[int(p) for p in self.pw.get().split(',')],
+                            search=self.search.get())
             except ValueError:
                 return None
 
@@ -199,7 +206,8 @@ if __name__ == "__main__":
     parameters = dict(voltage=50,
                       max_current=12,
                       shunt=0.025600,
-                      pw=[10, 30, 30, 30, 30, 100, 300])
+                      pw=[10, 30, 30, 30, 30, 100, 300],
+                      search=False)
 
     parameters = StartCldDialog.new_dialog_with_results(**parameters)
     print(parameters)
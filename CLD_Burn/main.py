@@ -5,11 +5,13 @@ sys.path.append(str(pathlib.Path('../_libs/').resolve()))
 from VISA.VISA_controller import VisaController
 from VISA.DS4024 import DS4024
 from VISA.MODEL_2410 import MODEL2410
+from VISA.executor import AsyncInstrument, gather
 
 from ArduinoCLDBurn import ArduinoCLD
 from Gui_CLD import NextCldDialog, StartCldDialog
 from plot_cld import plot_cld
 from save_cld import save_cld
+from pw_search import PulseWidthSearch
 
 import time as tme
 
@@ -35,8 +37,10 @@ vc = VisaController(query='?*::INSTR', verbose=True)
 #   # Various devices, as many as needed (but only one object for one real device) #   #
 inst = vc.get_instruments_by_name(DS4024.NAME)[0]
 ds = DS4024(inst)
+ds_async = AsyncInstrument(ds, inst)
 inst = vc.get_instruments_by_name(MODEL2410.NAME)[0]
 k2410 = MODEL2410(inst)
+k2410_async = AsyncInstrument(k2410, inst)
 inst = vc.get_instruments_by_name(ArduinoCLD.NAME)[0]
 arduino = ArduinoCLD(inst)
 
@@ -59,7 +63,8 @@ try:
                       max_current=20,
                       shunt=0.025600,
                       pw=[10, 30, 50, 70, 100, 120, 150, 200, 250, 300, 400, 500, 700, 1000, 1500, 2000, 3000, 5000,
-                          10000])
+                          10000],
+                      search=False)  # Search the burn width between the first and last pw, instead of walking the list
     parameters = StartCldDialog.new_dialog_with_results(**parameters)  # Dialog box to change parameters
     if parameters is None:
         exit()
@@ -86,21 +91,26 @@ try:
         # Instruments setup #
         # ################# #
 
+        #   # Scope and 2410 are independent, both are set up at the same time #  #
+        setup = []
+
         #   # Scope channels #  #
-        ds.chn_display(ds.Channels.CHANNEL1, True)
-        ds.chn_display(ds.Channels.CHANNEL2, True)
-        ds.chn_display(ds.Channels.CHANNEL3, False)
-        ds.chn_display(ds.Channels.CHANNEL4, False)
+        setup.append(ds_async.chn_display(ds.Channels.CHANNEL1, True))
+        setup.append(ds_async.chn_display(ds.Channels.CHANNEL2, True))
+        setup.append(ds_async.chn_display(ds.Channels.CHANNEL3, False))
+        setup.append(ds_async.chn_display(ds.Channels.CHANNEL4, False))
 
         #   # Channels ratio #  #
-        ds.set_chn_ratio(ds.Channels.CHANNEL1, ds.Ratios.X10)
-        ds.set_chn_ratio(ds.Channels.CHANNEL2, ds.Ratios.X1)
+        setup.append(ds_async.set_chn_ratio(ds.Channels.CHANNEL1, ds.Ratios.X10))
+        setup.append(ds_async.set_chn_ratio(ds.Channels.CHANNEL2, ds.Ratios.X1))
 
         #   # 2410 in v-source mode, output mode ZERO #  #
         # k2410.melody([(440, .25), (500, .5)])
-        k2410.v_source_wizard(parameters["voltage"], 10e-3)
-        k2410.output_mode = k2410.OutputModes.ZERO
-        k2410.text1_dis = False
+        setup.append(k2410_async.v_source_wizard(parameters["voltage"], 10e-3))
+        setup.append(k2410_async.set('output_mode', k2410.OutputModes.ZERO))
+        setup.append(k2410_async.set('text1_dis', False))
+
+        gather(*setup)
 
         # ################# #
         # Start a pulse row #
@@ -111,7 +121,11 @@ try:
         k2410.key_press = k2410.Keys.V_MEAS
         k2410.key_press = k2410.Keys.LOCAL
         tme.sleep(parameters["voltage"] / 100 + 1)
-        for pw in parameters["pw"]:
+        search = None
+        if parameters["search"]:
+            search = PulseWidthSearch(parameters["max_current"], start=min(parameters["pw"]),
+                                      stop=max(parameters["pw"]))
+        for pw in (search or parameters["pw"]):
 
             # ################# #
             # Instruments setup #
@@ -147,15 +161,33 @@ try:
             while not ds.stopped:
                 pass
 
-            #   # Retrieve data #  #
-            time, volt = ds.get_curve(ds.Channels.CHANNEL1)
-            _, current = ds.get_curve(ds.Channels.CHANNEL2, custom_scale=1 / parameters["shunt"])
-            time, volt, current = resize(time, volt, current)
+            #   # Transfer the waveforms only if kept, or if the scope measurements are not enough #  #
+            keep = cld_info["csv"] or cld_info["png"] or cld_info["show"]
+            values, curves = ds.measure_first(
+                {'surge': (ds.Measures.MAX, ds.Channels.CHANNEL2, 1 / parameters["shunt"]),
+                 'nominal': (ds.Measures.TOP, ds.Channels.CHANNEL2, 1 / parameters["shunt"])},
+                lambda m: keep or None in m.values() or m['surge'] > parameters["max_current"],
+                {'volt': (ds.Channels.CHANNEL1, 1), 'current': (ds.Channels.CHANNEL2, 1 / parameters["shunt"])})
+
+            #   # Check for over current, on the waveform when it is transferred, else on the scope measurements #  #
+            surge_current, nominal_current = values['surge'], values['nominal']
+            if curves:
+                time, volt = curves['volt']
+                _, current = curves['current']
+                time, volt, current = resize(time, volt, current)
+                if len(current):
+                    surge_current = max(current)
+                    nominal_current = current[int(len(current) / 2)]
+                else:
+                    curves = {}  # Nothing transferred, nothing to save
+
+            if surge_current is None or nominal_current is None:
+                print("NO CURRENT MEASURED ! End of the pulse row")
+                break
 
-            #   # Check for over current #  #
-            surge_current = max(current)
-            nominal_current = current[int(len(current) / 2)]
             over_current = surge_current > parameters["max_current"]
+            if search is not None:
+                search.record(pw, surge_current, nominal_current, over_current)
             if over_current:
                 print("OVER CURRENT !")
                 k2410.text1 = f"{'The CLD burned !':^20}"
@@ -174,18 +206,27 @@ try:
                            str(int(round(nominal_current))) + 'A' + \
                            ('_BURNED' if over_current else '')
 
-            #   # Plotting (and saving to png) #  #
-            plot_cld(time, volt, current, cld_filename, time_scale=1e6, max_voltage=parameters["voltage"] * 4 / 3,
-                     max_current=parameters["max_current"] + 1, show=cld_info["show"], save=cld_info["png"],
-                     path=path_png)
+            if curves:
+                #   # Saving to csv #  #
+                source = None
+                if cld_info["csv"]:
+                    source = save_cld(time, volt, current, cld_filename, path=path_csv, diode=cld_info["name"],
+                                      amp=surge_current, temp=25, pulse_width=pw * 1e-6, burned=over_current)
 
-            #   # Saving to csv #  #
-            if cld_info["csv"]:
-                save_cld(time, volt, current, cld_filename, path=path_csv)
+                #   # Plotting (and saving to png), from the pyramids saved with the csv #  #
+                plot_cld(time, volt, current, cld_filename, time_scale=1e6, max_voltage=parameters["voltage"] * 4 / 3,
+                         max_current=parameters["max_current"] + 1, show=cld_info["show"], save=cld_info["png"],
+                         path=path_png, source=source)
+            else:
+                print(f"{cld_filename} : {surge_current:.2f}A, not saved")
 
             if over_current:
                 break
 
+        if search is not None:
+            search.save(path_csv / (cld_base_filename + '_search.csv'))
+            print(f"{len(search.trace)} pulses, burn width between {search.threshold[0]}us and {search.threshold[1]}us")
+
         #   # End of pulse row, ready to the next one #  #
         k2410.output = False
         arduino.red(False)
@@ -118,12 +118,13 @@ try:
 
         cld_filename = name + '_' + str(int(i))
 
-        #   # Plotting (and saving to png) #  #
-        plot_cld(time, volt, current, cld_filename, time_scale=1e3, max_voltage=max_voltage * 4 / 3,
-                 max_current=max_current + 1, show=False, save=True, path=path_png)
-
         #   # Saving to csv #  #
-        save_cld(time, volt, current, cld_filename, path=path_csv)
+        source = save_cld(time, volt, current, cld_filename, path=path_csv, diode=name, pulse_width=pw * 1e-3,
+                          amp=max(current))
+
+        #   # Plotting (and saving to png), from the pyramids saved with the csv #  #
+        plot_cld(time, volt, current, cld_filename, time_scale=1e3, max_voltage=max_voltage * 4 / 3,
+                 max_current=max_current + 1, show=False, save=True, path=path_png, source=source)
 
 
     #   # End of pulse row, ready to the next one #  #
@@ -1,19 +1,43 @@
 import math
+import pathlib, sys
 from matplotlib import pyplot as plt
 from pathlib import Path
 
+sys.path.append(str(pathlib.Path('../_libs/').resolve()))
+
+from Utils.pyramid import MinMaxPyramid
+
 
 def plot_cld(time: list, voltage: list, current: list, filename: str = 'graph', *,
              time_scale: float = 1, max_voltage: float = 100, max_current: float = 10,
-             show: bool = True, save: bool = False, show_png: bool = False, path: Path = None):
+             show: bool = True, save: bool = False, show_png: bool = False, path: Path = None, lod: bool = True,
+             source: Path = None):
+    """Plot the voltage and the current of a pulse.
+
+    With lod, a capture longer than the plot is drawn from a MinMaxPyramid: only the min/max envelope fitting the
+    pixel width is given to matplotlib, and it is refined when zooming. The pyramids saved with the csv of the pulse
+    (source, see save_cld) are used when they exist, instead of being built again.
+    """
     if show_png:
         raise NotImplementedError
 
     fig, (ax1, ax2) = plt.subplots(2, 1)
 
-    time = [t*time_scale for t in time]
-    
-    ax1.plot(time, voltage)
+    if lod and len(time) > 2 * ax1.bbox.width:
+        sidecar = None if source is None else MinMaxPyramid.sidecar(source)
+        if sidecar is not None and sidecar.is_file():
+            pyramids = MinMaxPyramid.load_all(sidecar)
+        else:
+            pyramids = MinMaxPyramid.build_all(time, {"Voltage": voltage, "Current": current})
+        for pyramid, ax in ((pyramids["Voltage"], ax1), (pyramids["Current"], ax2)):
+            pyramid.start *= time_scale
+            pyramid.step *= time_scale
+            pyramid.plot(ax)
+    else:
+        time = [t*time_scale for t in time]
+        ax1.plot(time, voltage)
+        ax2.plot(time, current)
+
     ax1.set_title(filename, fontsize=10)
     # ax1.set_title('Voltage over time')
     ax1.set_xlabel('Time (us)', fontsize=14)
@@ -23,7 +47,6 @@ def plot_cld(time: list, voltage: list, current: list, filename: str = 'graph',
     ax1.tick_params('y', labelsize=12)
     ax1.grid(True)
 
-    ax2.plot(time, current)
     # ax2.set_title('Current over time')
     ax2.set_xlabel('Time (us)', fontsize=14)
     ax2.set_ylabel('Current (A)', fontsize=14)
@@ -0,0 +1,128 @@
+from collections import namedtuple
+from pathlib import Path
+from typing import Iterator, List, Tuple
+import csv
+import math
+import time as tme
+
+
+class PulseWidthSearch:
+    """Find the pulse width that burns a CLD, with as few pulses as possible.
+
+    A burned CLD can't be pulsed again, so the threshold is approached from below only: the width grows by a coarse
+    factor while the surge current is far from the limit, and by smaller and smaller factors as the trend of the
+    current (a power law fitted on the last pulses) predicts that the limit is near. The search ends on the first
+    over current, the threshold being between the last two widths.
+
+    >>>search = PulseWidthSearch(max_current=20, start=10, stop=10000)
+    ...for pw in search:
+    ...    surge, nominal = pulse_and_measure(pw)
+    ...    search.record(pw, surge, nominal, surge > 20)
+    ...print(search.threshold)
+    """
+
+    Trial = namedtuple('Trial', ['pw', 'surge', 'nominal', 'burned', 'factor', 'timestamp'])
+    Trial.__doc__ = """A pulse of the search"""
+    Trial.pw.__doc__ += """ : Pulse width (us)"""
+    Trial.surge.__doc__ += """ : Maximum current of the pulse (A)"""
+    Trial.nominal.__doc__ += """ : Current in the middle of the pulse (A)"""
+    Trial.burned.__doc__ += """ : True if the current went over the limit"""
+    Trial.factor.__doc__ += """ : Growth of the width from the previous pulse"""
+    Trial.timestamp.__doc__ += """ : Time of the pulse (s, epoch)"""
+
+    def __init__(self, max_current: float, *, start: int = 10, stop: int = 10000, coarse: float = 3,
+                 fine: float = 1.1, margin: float = .9, fit: int = 3):
+        """Initialize the search.
+
+        :param max_current: current limit, a pulse over it burned the CLD (A)
+        :param start: first pulse width (us)
+        :param stop: maximum pulse width (us)
+        :param coarse: largest growth of the width between two pulses
+        :param fine: smallest growth of the width between two pulses
+        :param margin: the step aims at this fraction of max_current, so the limit is crossed by a fine step
+        :param fit: number of pulses used for the trend of the current
+        """
+        self.max_current = max_current
+        self.start = start
+        self.stop = stop
+        self.coarse = coarse
+        self.fine = fine
+        self.margin = margin
+        self.fit = fit
+        self.trace: List[PulseWidthSearch.Trial] = []
+        self.__factor = 1
+
+    def __iter__(self) -> Iterator[int]:
+        pw = self.start
+        while pw is not None:
+            count = len(self.trace)
+            yield pw
+            if len(self.trace) == count:
+                raise RuntimeError(f"The result of the pulse of {pw}us was not recorded")
+            pw = self.next()
+
+    def record(self, pw: int, surge: float, nominal: float, burned: bool):
+        """Record the result of a pulse.
+
+        :param pw: pulse width (us)
+        :param surge: maximum current of the pulse (A)
+        :param nominal: current in the middle of the pulse (A)
+        :param burned: True if the current went over the limit
+        """
+        self.trace.append(PulseWidthSearch.Trial(pw, surge, nominal, burned, self.__factor, tme.time()))
+
+    def next(self) -> int:
+        """Compute the next pulse width from the trend of the current.
+
+        :return: the width (us), None if the search is over (burned, or stop reached)
+        """
+        last = self.trace[-1]
+        if last.burned or last.pw >= self.stop:
+            return None
+
+        target = self.margin * self.max_current
+        points = [(math.log(t.pw), math.log(t.surge)) for t in self.trace[-self.fit:] if t.surge > 0]
+
+        factor = self.coarse
+        if last.surge >= target:
+            factor = self.fine
+        elif len(points) >= 2:
+            #  # Power law fit, surge = a * pw ** slope, then the width reaching the target #  #
+            mx = sum(x for x, _ in points) / len(points)
+            my = sum(y for _, y in points) / len(points)
+            sxx = sum((x - mx) ** 2 for x, _ in points)
+            slope = sum((x - mx) * (y - my) for x, y in points) / sxx if sxx else 0
+            if slope > 0:
+                factor = (target / last.surge) ** (1 / slope)
+        elif last.surge > 0:
+            factor = target / last.surge  # No trend yet, as if the current was proportional to the width
+
+        self.__factor = min(self.coarse, max(self.fine, factor))
+        return min(self.stop, max(last.pw + 1, round(last.pw * self.__factor)))
+
+    @property
+    def threshold(self) -> Tuple[int, int]:
+        """Bracket of the burn width (us): the last width that did not burn the CLD (None if the first one did), and the
+        width that did (None if it never burned)."""
+        safe = [t.pw for t in self.trace if not t.burned]
+        burned = [t.pw for t in self.trace if t.burned]
+        return (safe[-1] if safe else None), (burned[0] if burned else None)
+
+    def save(self, full_path: Path, delimiter: str = ","):
+        """Write the trace of the search to a csv."""
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(full_path.resolve()), 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file, dialect='excel', delimiter=delimiter)
+            writer.writerow(["Pulse width (us)", "Surge current (A)", "Nominal current (A)", "Burned", "Factor",
+                             "Timestamp (s)"])
+            writer.writerows(self.trace)
+
+
+if __name__ == "__main__":
+    # A CLD whose current rises with the width, burning at 20A (about 1300us)
+    search = PulseWidthSearch(max_current=20, start=10, stop=10000)
+    for pw in search:
+        surge = 2 * (pw / 10) ** .47
+        search.record(pw, surge, surge * .8, surge > 20)
+        print(f"{pw}us : {surge:.2f}A")
+    print(f"{len(search.trace)} pulses, threshold between {search.threshold}")
@@ -1,10 +1,29 @@
 import math
+import pathlib, sys
 from pathlib import Path
 import csv
 
+sys.path.append(str(pathlib.Path('../_libs/').resolve()))
+
+from Utils.catalog import Catalog
+from Utils.pyramid import MinMaxPyramid
+
 
 def save_cld(time: list, voltage: list, current: list, filename: str = 'graph', *,
-             path: Path = None, delimiter: str = ","):
+             path: Path = None, delimiter: str = ",", diode: str = None, amp: float = None, temp: float = None,
+             pulse_width: float = None, burned: bool = False, catalog: Catalog = None, lod: bool = True) -> Path:
+    """Save a pulse to a csv, and add it to the catalog.
+
+    :param diode: name of the diode (None for the filename)
+    :param amp: surge current (A)
+    :param temp: temperature (Celsius)
+    :param pulse_width: pulse width (s)
+    :param burned: True if the diode was burned by this pulse
+    :param catalog: catalog of the records (None for the one of the csv folder)
+    :param lod: also save the MinMaxPyramid of the voltage and the current, used by plot_cld (see
+                MinMaxPyramid.sidecar)
+    :return: the path of the csv
+    """
     if path is None:
         path = Path("./")
     path.resolve()
@@ -20,6 +39,14 @@ def save_cld(time: list, voltage: list, current: list, filename: str = 'graph',
         writer.writerow(["s", "V", "A"])
         writer.writerows(rows)
 
+    if lod and rows:
+        MinMaxPyramid.save_all(MinMaxPyramid.sidecar(full_path),
+                               MinMaxPyramid.build_all(time, {"Voltage": voltage, "Current": current}))
+
+    (catalog or Catalog.open(path)).add(full_path, diode=diode or filename, test='cld', amp=amp, temp=temp,
+                                        pulse_width=pulse_width, burned=burned, rows=len(rows))
+    return full_path
+
 
 if __name__ == "__main__":
     t = list(range(10))
@@ -4,16 +4,22 @@ import csv
 from typing import List
 import pathlib
 from VISA.MODEL_2410 import MODEL2410
+from Utils.catalog import Catalog
+from Utils.pyramid import MinMaxPyramid
 
 
-def diode_save(columns: List, rows: List, path: pathlib.Path, save_params, test_datas):
-    """Save a list of rows to a csv, automatically named.
+def diode_save(columns: List, rows: List, path: pathlib.Path, save_params, test_datas, catalog: Catalog = None,
+               lod: bool = False):
+    """Save a list of rows to a csv, automatically named, and add it to the catalog.
 
     :param columns: list of columns names
     :param rows: the list of rows to be saved
     :param path: Path to the csv folder
     :param save_params: dirname and filename template
     :param test_datas: values of the test (used for saving/naming)
+    :param catalog: catalog of the records (None for the one of the csv folder)
+    :param lod: also save the MinMaxPyramid of each column over the first one (the time), for the plots of long
+                captures (see MinMaxPyramid.sidecar)
     """
     # ###### #
     # Saving #
@@ -27,6 +33,16 @@ def diode_save(columns: List, rows: List, path: pathlib.Path, save_params, test_
         writer.writerow(columns)
         writer.writerows(rows)
 
+    if lod and rows:
+        data = list(zip(*rows))
+        MinMaxPyramid.save_all(MinMaxPyramid.sidecar(full_path),
+                               MinMaxPyramid.build_all(data[0], dict(zip(columns[1:], data[1:]))))
+
+    datas = test_datas._asdict()
+    (catalog or Catalog.open(path)).add(full_path, diode=test_datas.name, test=save_params.dirname.lower(),
+                                        amp=datas.get('amp'), temp=datas.get('temp'),
+                                        repetition=datas.get('repetition'), rows=len(rows))
+
 
 def diode_iv_and_save(k2410: MODEL2410, test_params, columns: List, path: pathlib.Path, save_params, test_datas,
                       autoscale=False):
@@ -39,6 +55,7 @@ def diode_iv_and_save(k2410: MODEL2410, test_params, columns: List, path: pathli
     :param save_params: dirname and filename template
     :param test_datas: values of the test (used for saving/naming)
     :param autoscale: If the measure is to low compared to the compliance, adjust the compliance and retry
+    :return: the number of autoscale retries of the sweep
     """
     # ########### #
     # Acquisition #
@@ -52,6 +69,8 @@ def diode_iv_and_save(k2410: MODEL2410, test_params, columns: List, path: pathli
     rows = [[d.timestamp, -d.current, -d.voltage] for d in data]
     diode_save(columns, rows, path, save_params, test_datas)
 
+    return k2410.retries
+
 
 def diode_vi_and_save(k2410: MODEL2410, test_params, columns: List, path: pathlib.Path, save_params, test_datas,
                       autoscale=False):
@@ -64,6 +83,7 @@ def diode_vi_and_save(k2410: MODEL2410, test_params, columns: List, path: pathli
     :param save_params: dirname and filename template
     :param test_datas: values of the test (used for saving/naming)
     :param autoscale: If the measure is to low compared to the compliance, adjust the compliance and retry
+    :return: the number of autoscale retries of the sweep
     """
     # ########### #
     # Acquisition #
@@ -77,3 +97,5 @@ def diode_vi_and_save(k2410: MODEL2410, test_params, columns: List, path: pathli
     # ###### #
     rows = [[d.timestamp, -d.current, -d.voltage] for d in data]
     diode_save(columns, rows, path, save_params, test_datas)
+
+    return k2410.retries
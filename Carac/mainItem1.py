@@ -8,23 +8,19 @@ from VISA.DS4024 import DS4024
 
 from Utils.logger import Logger
 from Utils.mail import simple_mail_sender
+from Utils.checkpoint import Checkpoint
 
 from ArduinoCarac import ArduinoCarac
 from diode_test_and_save import diode_iv_and_save, diode_save
 from GUI import diode_map
+from surge_pipeline import SurgePipeline
+from surge_features import FeatureTable, DeathDetector
 
 import time as tme
 from collections import namedtuple
 import traceback
 
 
-# Put all arrays to the size of the smaller one
-def resize(*args: list):
-    size = min(*[len(arg) for arg in args])
-    r_args = [arg[0:size] for arg in args]
-    return tuple(r_args)
-
-
 # ########## #
 # VISA stuff #
 # ########## #
@@ -98,7 +94,23 @@ SCOPE_TIMEOUT = 5  # Secs
 # Setup #
 # ##### #
 
-logger = Logger(logger_id="Carac", time_format="%d/%m/%y %H:%M:%S", path=pathlib.Path('./log'), default_save=True)
+logger = Logger(logger_id="Carac", time_format="%d/%m/%y %H:%M:%S", path=pathlib.Path('./log'), default_save=True,
+                asynchronous=True, structured=True)  # JSON lines, with the fields given to log
+
+#  # Done surge currents of each diode, to resume after a crash (delete the file to start again) #  #
+checkpoint = Checkpoint(PATH / "checkpoint.json")
+DONE = checkpoint.load() or {'first_time': True, 'diodes': {}}
+
+pipeline = SurgePipeline(scope, surge, SURGE_PARAMS.delay, SHUNT, timeout=SCOPE_TIMEOUT)
+features = FeatureTable(PATH)  # Live trends of each diode, in <diode>/<diode>_features.csv
+#  # The current rises each shot: only the resistance is compared, with a wide floor for its slow drift #  #
+detector = DeathDetector(('resistance',), floor=.3)
+
+
+def save_surge(capture: SurgePipeline.Capture, test_datas):
+    rows = [[capture.time[i] * 1e3, capture.current[i], capture.volt[i]] for i in range(len(capture.time))]
+    diode_save(COLUMNS, rows, PATH, SURGE_NAMES, test_datas, lod=True)
+
 
 Diode = namedtuple("Diode", ['board', 'name'])
 TestData = namedtuple("TestData", ['name', 'amp', 'temp'])
@@ -162,13 +174,19 @@ try:
     k2410.key_press = k2410.Keys.I_MEAS
     k2410.key_press = k2410.Keys.LOCAL
 
-    first_time = True
+    first_time = DONE['first_time']
 
     for diode in DIODES:
+        done = DONE['diodes'].get(diode.name, {'last': None, 'finished': False})
+        if done['finished']:
+            logger.log(0, f"=Diode {diode.name} already done")
+            continue
         logger.log(0, f"+Diode {diode.name}")
 
         is_dead = False
-        for surge_current in range(0, SURGE_PARAMS.max_current + 1, SURGE_PARAMS.step_current):
+        first_current = 0 if done['last'] is None else done['last'] + SURGE_PARAMS.step_current
+        surge_current = done['last']
+        for surge_current in range(first_current, SURGE_PARAMS.max_current + 1, SURGE_PARAMS.step_current):
             # ################# #
             # Instruments setup #
             # ################# #
@@ -176,6 +194,7 @@ try:
             logger.log(2, "Setup")
 
             test_datas = TestData(name=diode.name, amp=surge_current, temp=TEMPERATURE)
+            suspect = False
 
             #  # Surge setup #  #
             bin_current = max(0, min(255, round(surge_current * SURGE_PARAMS.scale_factor)))
@@ -199,50 +218,50 @@ try:
                 logger.log(2, "Acquisition")
 
                 # The first time, two pulses are played to initialize the surge controller
-                for _ in range(2 if first_time else 1):
-                    #   # Start scope in SINGLE mode and pulse ! #  #
-                    scope.running = True
-                    scope.sweep = scope.Sweeps.SINGLE
-                    tme.sleep(.5)
-                    surge.write_raw(f"s")
-                    tme.sleep(.2)
-                    logger.log(2, f"ans: {surge.read().strip()}")
-
-                    #   # Wait until acquired #  #
-                    ts = tme.time()
-                    while not scope.stopped and not is_dead:
-                        if (ts + SCOPE_TIMEOUT) < tme.time():
-                            is_dead = True
-
-                    tme.sleep(SURGE_PARAMS.delay)
-
+                if first_time:
+                    _, is_dead = pipeline.shot(read=False)
+                    logger.log(2, f"ans: {pipeline.answer}")
                 first_time = False
 
                 if not is_dead:
-                    #   # Retrieve data #  #
-                    time, volt = scope.get_curve(scope.Channels.CHANNEL2)
-                    _, current = scope.get_curve(scope.Channels.CHANNEL1, custom_scale=1 / SHUNT)
-                    time, volt, current = resize(time, volt, current)
+                    capture, is_dead = pipeline.shot()
+                    logger.log(2, f"ans: {pipeline.answer}")
+
+                if not is_dead:
+                    #  # Analysis, before the buffers are released by the saving #  #
+                    shot = features.add(diode.name, capture.time, capture.volt, capture.current, amp=surge_current)
+                    logger.log(2, f"{shot.peak_current:.1f} A, {shot.peak_voltage:.2f} V, "
+                                  f"{shot.resistance * 1e3:.1f} mOhm, {shot.energy:.3f} J", **shot._asdict())
+
+                    #  # Early death detection, against the last healthy shots of the diode #  #
+                    verdict, distances = detector.check(diode.name, shot)
+                    if verdict != DeathDetector.Verdicts.OK:
+                        logger.log(2, f"{verdict.value} : " + ", ".join(f"{k} {v:.1f}" for k, v in distances.items()),
+                                   verdict=verdict.value)
+                    suspect = verdict == DeathDetector.Verdicts.SUSPECT  # Checked by an IV right now
+                    is_dead = verdict == DeathDetector.Verdicts.DEAD
 
                     # ###### #
                     # Saving #
                     # ###### #
                     logger.log(2, "Saving")
-                    rows = [[time[i] * 1e3, current[i], volt[i]] for i in range(len(time))]
-                    diode_save(COLUMNS, rows, PATH, SURGE_NAMES, test_datas)
+                    pipeline.save(save_surge, capture, test_datas)
 
-            do_IV = is_dead or surge_current == 0 or surge_current == SURGE_PARAMS.max_current
+            do_IV = is_dead or suspect or surge_current == 0 or surge_current == SURGE_PARAMS.max_current
             if do_IV_each_time or do_IV:
                 # ################### #
                 # IV characterization #
                 # ################### #
 
                 logger.log(2, "Doing IV")
+                pipeline.wait_cooldown()
                 delay = arduino.measure(diode.board)
                 tme.sleep(delay + .5)
 
                 logger.log(3, "Direct")
-                diode_iv_and_save(k2410, DIRECT_PARAMS, COLUMNS, PATH, DIRECT_NAMES, test_datas, autoscale=True)
+                retries = diode_iv_and_save(k2410, DIRECT_PARAMS, COLUMNS, PATH, DIRECT_NAMES, test_datas,
+                                            autoscale=True)
+                logger.log(4, f"{retries} autoscale retries")
                 tme.sleep(1)
                 logger.log(3, "Inverse")
                 diode_iv_and_save(k2410, REVERSE_PARAMS, COLUMNS, PATH, REVERSE_NAMES, test_datas)
@@ -250,11 +269,19 @@ try:
                 delay = arduino.surge(diode.board)
                 tme.sleep(delay + .5)
 
+            pipeline.flush()  # A current is only done once its waveform is on disk
+            DONE['first_time'] = first_time
+            DONE['diodes'][diode.name] = {'last': surge_current, 'finished': is_dead}
+            checkpoint.save(DONE)
+
             if is_dead:
                 break
 
+        DONE['diodes'][diode.name] = {'last': surge_current, 'finished': True}
+        checkpoint.save(DONE)
         logger.log(0, f"-Diode {diode.name}")
 
+    pipeline.flush()
     logger.log(0, "End")
 
     k2410.output = False
@@ -287,8 +314,11 @@ else:
     arduino.red(False)
     arduino.orange(False)
     arduino.stop()
+    checkpoint.clear()
 
 try:
+    pipeline.close()
+
     del surge
     del arduino
     del scope
@@ -12,6 +12,7 @@ from VISA.DS4024 import DS4024
 
 from ArduinoCarac import ArduinoCarac
 from diode_test_and_save import diode_iv_and_save, diode_save
+from surge_features import FeatureTable, DeathDetector
 
 import time as tme
 from collections import namedtuple
@@ -102,7 +103,10 @@ SCOPE_TIMEOUT = 5  # Secs
 # Setup #
 # ##### #
 
-logger = Logger(logger_id="Repetitive", time_format="%d/%m/%y %H:%M:%S", path=pathlib.Path('./log'), default_save=True)
+logger = Logger(logger_id="Repetitive", time_format="%d/%m/%y %H:%M:%S", path=pathlib.Path('./log'), default_save=True,
+                asynchronous=True, structured=True)  # JSON lines, with the fields given to log
+features = FeatureTable(PATH)  # Live trends of each diode, in <diode>/<diode>_features.csv
+detector = DeathDetector(('resistance', 'peak_voltage'))  # Same current each shot, the features must not move
 
 Diode = namedtuple("Diode", ['board', 'name'])
 TestData = namedtuple("TestData", ['name', 'amp', 'temp', 'repetition'])
@@ -196,8 +200,9 @@ try:
         is_dead = False
         for rep in range(0, SURGE_PARAMS.repetition + 1):
 
-            logger.log(2, f">{rep}")
+            logger.log(2, f">{rep}", rep=rep)
             test_datas = TestData(name=diode.name, amp=surge_current, temp=TEMPERATURE, repetition=rep)
+            suspect = False
 
             if rep > 0:
                 # ########### #
@@ -225,16 +230,28 @@ try:
                     _, current = scope.get_curve(scope.Channels.CHANNEL1, custom_scale=1 / SHUNT)
                     time, volt, current = resize(time, volt, current)
 
+                    shot = features.add(diode.name, time, volt, current, amp=surge_current, repetition=rep)
+                    logger.log(3, f"{shot.peak_current:.1f} A, {shot.peak_voltage:.2f} V, "
+                                  f"{shot.resistance * 1e3:.1f} mOhm, {shot.energy:.3f} J", **shot._asdict())
+
+                    #  # Early death detection, against the last healthy shots of the diode #  #
+                    verdict, distances = detector.check(diode.name, shot)
+                    if verdict != DeathDetector.Verdicts.OK:
+                        logger.log(3, f"{verdict.value} : " + ", ".join(f"{k} {v:.1f}" for k, v in distances.items()),
+                                   verdict=verdict.value)
+                    suspect = verdict == DeathDetector.Verdicts.SUSPECT  # Checked by an IV right now
+                    is_dead = verdict == DeathDetector.Verdicts.DEAD
+
                     # ###### #
                     # Saving #
                     # ###### #
                     logger.log(3, "Saving")
                     rows = [[time[i]*1e3, current[i], volt[i]] for i in range(len(time))]
-                    diode_save(COLUMNS, rows, PATH, SURGE_NAMES, test_datas)
+                    diode_save(COLUMNS, rows, PATH, SURGE_NAMES, test_datas, lod=True)
 
                     tme.sleep(SURGE_PARAMS.delay)
 
-            if do_IV_each_time or is_dead or rep == 0 or rep == SURGE_PARAMS.repetition:
+            if do_IV_each_time or is_dead or suspect or rep == 0 or rep == SURGE_PARAMS.repetition:
                 # ################### #
                 # IV characterization #
                 # ################### #
@@ -1,6 +1,7 @@
 from copy import deepcopy
 from typing import List, Tuple, Dict
 from pathlib import Path
+import pathlib, sys
 
 import math
 from natsort import natsorted
@@ -8,13 +9,18 @@ from matplotlib import pyplot as plt
 import pandas as pd
 import numpy as np
 
+sys.path.append(str(pathlib.Path('../_libs/').resolve()))
+
+from Utils.pyramid import MinMaxPyramid
+
 
 def read_data(path: Path, diodename: str, test: str) -> Tuple[List[str], Dict[str, pd.DataFrame]]:
     full_path = path / diodename / test
     data = {}
 
-    for file in natsorted(full_path.iterdir(), key=lambda x: x.stem):
+    for file in natsorted(full_path.glob('*.csv'), key=lambda x: x.stem):
         data[file.stem] = pd.read_csv(file)
+        data[file.stem].attrs['lod_file'] = MinMaxPyramid.sidecar(file)  # Saved with the csv, see get_pyramid
     # Could use that too : data=OrderedDict(natsorted(data.items()))
     columns = list(list(data.values())[0].columns)
 
@@ -25,13 +31,13 @@ def read_data_rows_as_df(path: Path, diodename: str, test: str) -> Tuple[List[st
     full_path = path / diodename / test
     data = []
 
-    df = pd.read_csv(list(full_path.iterdir())[0])
+    df = pd.read_csv(list(full_path.glob('*.csv'))[0])
     columns = list(df.columns)
     size = len(df)
     for _ in range(size):
         data.append(pd.DataFrame(columns=df.columns))
 
-    for file in natsorted(full_path.iterdir(), key=lambda x: x.stem):
+    for file in natsorted(full_path.glob('*.csv'), key=lambda x: x.stem):
         df = pd.read_csv(file)
         for i in range(size):
             data[i] = data[i].append(df.loc[i], ignore_index=True)
@@ -64,6 +70,8 @@ def filter_all(data: Dict[str, pd.DataFrame], columns: List[str], name: str, fil
         filt = np.ones(filt) / filt
     for df in data.values():
         df[name] = np.convolve(filt, df[name], mode='same')
+        df.attrs.get('lod', {}).pop(name, None)
+        df.attrs.pop('lod_file', None)  # The saved pyramids are not filtered
 
 
 def align_all(data: Dict[str, pd.DataFrame], columns: List[str]):
@@ -79,19 +87,50 @@ def align_all(data: Dict[str, pd.DataFrame], columns: List[str]):
         t_offset = t_offset + (t_max / 2 - c_max) * t_step
 
         df[ti] = [t + t_offset for t in df[ti]]
-
-
-def plot_all(data: Dict[str, pd.DataFrame], columns: List[str], x: str, y: str, grouped: bool = True, **kwargs):
+        df.attrs.pop('lod', None)
+        df.attrs.pop('lod_file', None)
+
+
+def get_pyramid(df: pd.DataFrame, x: str, y: str) -> MinMaxPyramid:
+    """Get the MinMaxPyramid of the column y over the time column x, kept in df.attrs.
+    On the first call, the pyramids saved with the csv (see diode_save) are loaded, and y is built only if it is not
+    one of them.
+    """
+    pyramids = df.attrs.setdefault('lod', {})
+    lod_file = df.attrs.pop('lod_file', None)
+    if y not in pyramids and lod_file is not None and lod_file.is_file() and x == df.columns[0]:
+        pyramids.update({k: v for k, v in MinMaxPyramid.load_all(lod_file).items() if k not in pyramids})
+    if y not in pyramids:
+        step = (df[x].iloc[-1] - df[x].iloc[0]) / max(1, len(df) - 1)
+        pyramids[y] = MinMaxPyramid(df[y].to_numpy(), df[x].iloc[0], step)
+    return pyramids[y]
+
+
+def plot_all(data: Dict[str, pd.DataFrame], columns: List[str], x: str, y: str, grouped: bool = True,
+             lod: bool = True, **kwargs):
+    """Plot y over x for each DataFrame.
+
+    With lod, curves over time longer than the plot are drawn from their MinMaxPyramid (see get_pyramid), so
+    overlaying a lot of long captures stays fast, and the details come back when zooming.
+    """
     x = find_column(columns, x)
     y = find_column(columns, y)
+    lod = lod and x == find_column(columns, "time")
 
     if grouped:
         fig, ax = plt.subplots()
     else:
         ax = None
+    width = int(ax.bbox.width if ax is not None else plt.rcParams['figure.figsize'][0] * plt.rcParams['figure.dpi'])
 
     for name, df in data.items():
-        df.plot(ax=ax, kind='line', x=x, y=y, label=name, **kwargs)
+        if lod and len(df) > 2 * width:
+            pyramid = get_pyramid(df, x, y)
+            envelope = pd.DataFrame(dict(zip((x, y), pyramid.envelope(width))))
+            line_ax = envelope.plot(ax=ax, kind='line', x=x, y=y, label=name, **kwargs)
+            pyramid.attach(line_ax, line_ax.get_lines()[-1])
+        else:
+            df.plot(ax=ax, kind='line', x=x, y=y, label=name, **kwargs)
 
 
 def plot_dots(ddots: Dict[str, List[Tuple[float, float]]], **kwargs):
@@ -0,0 +1,213 @@
+from collections import namedtuple, deque
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Tuple
+import csv
+import time as tme
+
+import numpy as np
+
+Features = namedtuple("Features", ['timestamp', 'amp', 'repetition', 'peak_current', 'peak_voltage', 'resistance',
+                                   'transition_voltage', 'transition_current', 'energy'])
+Features.__doc__ = """Features of a surge shot"""
+Features.timestamp.__doc__ += """ : Time of the analysis (s, epoch)"""
+Features.amp.__doc__ += """ : Surge current setpoint (A)"""
+Features.repetition.__doc__ += """ : Repetition of the shot (None if not repeated)"""
+Features.peak_current.__doc__ += """ : Maximum current (A)"""
+Features.peak_voltage.__doc__ += """ : Maximum voltage (V)"""
+Features.resistance.__doc__ += """ : Dynamic resistance V/I at the peak current (Ohms)"""
+Features.transition_voltage.__doc__ += """ : Voltage of the bipolar transition (V, nan if not found)"""
+Features.transition_current.__doc__ += """ : Current of the bipolar transition (A, nan if not found)"""
+Features.energy.__doc__ += """ : Energy dissipated in the diode (J)"""
+
+
+def extract(time, volt, current, *, threshold: float = 2, smooth: int = 75) -> Dict[str, float]:
+    """Compute the features of a surge waveform (vectorized, a few ms for a full memory depth).
+
+    The bipolar transition is the strongest bend (minimum of the second difference) of the voltage above threshold,
+    like plot_data.get_bipolar_transition, but on the voltage smoothed by a moving average: the second difference of
+    the raw samples is mostly quantization noise. The transitions of the two may differ by a few samples.
+
+    :param time: time of each sample (s)
+    :param volt: voltage across the diode (V)
+    :param current: surge current (A)
+    :param threshold: minimum voltage of the bipolar transition (V)
+    :param smooth: size of the moving average applied to the voltage before looking for the transition (samples)
+    :return: the features, by name (without timestamp, amp and repetition)
+    """
+    time = np.asarray(time, dtype=float)
+    volt = np.asarray(volt, dtype=float)
+    current = np.asarray(current, dtype=float)
+
+    peak = int(np.argmax(current))
+    peak_current = current[peak]
+    power = volt * current
+    energy = float(np.sum((power[1:] + power[:-1]) * np.diff(time)) / 2)
+
+    #  # Moving average by cumulative sum, linear in the number of samples #  #
+    smooth = max(1, min(smooth, len(volt)))
+    total = np.cumsum(np.insert(volt, 0, 0))
+    smoothed = (total[smooth:] - total[:-smooth]) / smooth
+    bend = np.diff(smoothed, 2)
+    above = smoothed[1:-1] >= threshold
+    if bend.size and above.any():
+        transition = int(np.argmin(np.where(above, bend, np.inf))) + 1 + smooth // 2
+        transition_voltage, transition_current = volt[transition], current[transition]
+    else:
+        transition_voltage, transition_current = np.nan, np.nan
+
+    return dict(peak_current=float(peak_current), peak_voltage=float(np.max(volt)),
+                resistance=float(volt[peak] / peak_current) if peak_current else np.nan,
+                transition_voltage=float(transition_voltage), transition_current=float(transition_current),
+                energy=energy)
+
+
+class FeatureTable:
+    """Features of every shot, one table per diode, filled as the waveforms arrive.
+
+    Each table is kept in memory (for the trends of a running campaign) and appended to a small csv, one line per
+    shot: <path>/<diode>/<diode>_features.csv. Trends over a whole campaign are read from there instead of reloading
+    all the waveforms.
+    """
+
+    def __init__(self, path: Path, *, threshold: float = 2, smooth: int = 75):
+        """Initialize the tables.
+
+        :param path: Path to the csv folder (the folder of each diode is created if needed)
+        :param threshold: see extract
+        :param smooth: see extract
+        """
+        self.path = path
+        self.threshold = threshold
+        self.smooth = smooth
+        self.__tables: Dict[str, List[Features]] = {}
+
+    def add(self, diode: str, time, volt, current, *, amp: float, repetition: int = None) -> Features:
+        """Analyse a shot and add it to the table of its diode.
+
+        :param diode: name of the diode
+        :param time: time of each sample (s)
+        :param volt: voltage across the diode (V)
+        :param current: surge current (A)
+        :param amp: surge current setpoint (A)
+        :param repetition: repetition of the shot
+        :return: the features
+        """
+        features = Features(timestamp=tme.time(), amp=amp, repetition=repetition,
+                            **extract(time, volt, current, threshold=self.threshold, smooth=self.smooth))
+        self.__tables.setdefault(diode, []).append(features)
+
+        full_path = self.path / diode / f"{diode}_features.csv"
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        new = not full_path.is_file()
+        with open(str(full_path.resolve()), 'a', newline='') as csv_file:
+            writer = csv.writer(csv_file, dialect='excel', delimiter=',')
+            if new:
+                writer.writerow(Features._fields)
+            writer.writerow(['' if v is None else v for v in features])
+
+        return features
+
+    def table(self, diode: str) -> List[Features]:
+        """Get the features of the shots of a diode, in order."""
+        return self.__tables.get(diode, [])
+
+    def trend(self, diode: str, name: str) -> np.ndarray:
+        """Get one feature of all the shots of a diode (ex. trend('D1', 'resistance')).
+
+        :return: the values, in order
+        """
+        return np.array([getattr(features, name) for features in self.table(diode)], dtype=float)
+
+
+class DeathDetector:
+    """Spot a failing diode from its surge waveforms, instead of waiting for the scope timeout or the next IV.
+
+    Each shot is compared to a rolling baseline of the last healthy shots of its diode: for each feature, the
+    distance to the median of the baseline, in robust deviations (MAD, floored to a fraction of the median so a very
+    steady diode is not flagged on noise). A shot out of the baseline is SUSPECT (check it with an IV now), several in
+    a row, or a shot where the current did not flow, mean the diode is DEAD.
+    """
+
+    class Verdicts(Enum):
+        OK = "ok"
+        SUSPECT = "suspect"
+        DEAD = "dead"
+
+    def __init__(self, features: Tuple[str, ...] = ('resistance', 'peak_voltage'), *, window: int = 20,
+                 warmup: int = 5, limit: float = 6, floor: float = .05, confirm: int = 2, min_current: float = .5):
+        """Initialize the baselines.
+
+        :param features: names of the Features compared to the baseline
+        :param window: number of healthy shots in the baseline
+        :param warmup: number of shots needed before judging (the first shots of a diode are always OK)
+        :param limit: maximum distance to the baseline, in robust deviations
+        :param floor: minimum deviation, relative to the median of the baseline
+        :param confirm: number of SUSPECT shots in a row giving DEAD
+        :param min_current: minimum peak current, relative to the setpoint (below, the diode is open: DEAD)
+        """
+        self.features = features
+        self.window = window
+        self.warmup = warmup
+        self.limit = limit
+        self.floor = floor
+        self.confirm = confirm
+        self.min_current = min_current
+        self.__baselines: Dict[str, deque] = {}
+        self.__suspects: Dict[str, int] = {}
+
+    def check(self, diode: str, shot: Features) -> Tuple['DeathDetector.Verdicts', Dict[str, float]]:
+        """Judge a new shot of a diode, and add it to its baseline if it is healthy.
+
+        :param diode: name of the diode
+        :param shot: the features of the shot (see FeatureTable.add)
+        :return: the verdict, and the distance of each feature to the baseline (in robust deviations)
+        """
+        baseline = self.__baselines.setdefault(diode, deque(maxlen=self.window))
+        values = np.array([getattr(shot, name) for name in self.features], dtype=float)
+
+        scores = np.zeros(len(values))
+        if len(baseline) >= self.warmup:
+            history = np.array(baseline)
+            median = np.median(history, axis=0)
+            deviation = np.maximum(1.4826 * np.median(np.abs(history - median), axis=0), self.floor * np.abs(median))
+            scores = np.abs(values - median) / np.where(deviation > 0, deviation, np.inf)
+        scores = np.where(np.isnan(values), np.inf, scores)
+        distances = dict(zip(self.features, scores.tolist()))
+
+        if shot.amp and shot.peak_current < self.min_current * shot.amp:
+            return DeathDetector.Verdicts.DEAD, distances
+
+        if np.all(scores <= self.limit):
+            self.__suspects[diode] = 0
+            baseline.append(values)
+            return DeathDetector.Verdicts.OK, distances
+
+        self.__suspects[diode] = self.__suspects.get(diode, 0) + 1
+        if self.__suspects[diode] >= self.confirm:
+            return DeathDetector.Verdicts.DEAD, distances
+        return DeathDetector.Verdicts.SUSPECT, distances
+
+    def reset(self, diode: str):
+        """Forget the baseline of a diode (ex. after a change of setpoint that moves the features)."""
+        self.__baselines.pop(diode, None)
+        self.__suspects.pop(diode, None)
+
+
+if __name__ == "__main__":
+    t = np.arange(1_400_000) * 1e-8
+    i = 100 * np.sin(np.pi * t / t[-1])
+    v = 1 + 0.02 * i + (i > 60) * 2
+
+    start = tme.time()
+    print(extract(t, v, i))
+    print(f"{(tme.time() - start) * 1e3:.1f}ms")
+
+    detector = DeathDetector()
+    rng = np.random.default_rng(0)
+    for rep in range(30):
+        r = .05 * (1 + .01 * rng.standard_normal()) * (3 if rep >= 25 else 1)  # Fails at the 25th shot
+        shot = Features(tme.time(), 100, rep, 100, 100 * r, r, np.nan, np.nan, 1)
+        verdict, distances = detector.check('D1', shot)
+        if verdict != DeathDetector.Verdicts.OK:
+            print(rep, verdict, distances)
@@ -0,0 +1,160 @@
+from collections import namedtuple
+from queue import Queue
+from threading import Thread
+from typing import Callable
+import time as tme
+
+from VISA.DS4024 import DS4024
+from VISA.buffers import BufferPool
+
+
+class SurgePipeline:
+    """Run surge shots back to back, bounded by the thermal delay only.
+
+    The cooldown of a shot starts at the pulse: the waveforms are read out while it runs, and the saving is done by
+    a background thread while the next shot is armed. The next shot (or anything that needs the diode to be cold,
+    see wait_cooldown) only waits for what remains of the delay.
+    The waveforms are read into pooled buffers, given back once saved: a steady surge loop does not allocate them.
+    """
+
+    Capture = namedtuple("Capture", ['time', 'volt', 'current', 'timestamp', 'buffers'])
+    Capture.__doc__ = """Waveforms of a surge shot"""
+    Capture.time.__doc__ += """ : Time of each sample (s)"""
+    Capture.volt.__doc__ += """ : Voltage across the diode (V)"""
+    Capture.current.__doc__ += """ : Surge current (A)"""
+    Capture.timestamp.__doc__ += """ : Time of the pulse (s, epoch)"""
+    Capture.buffers.__doc__ += """ : Pooled buffers holding the waveforms, released after the saving"""
+
+    def __init__(self, scope: DS4024, surge, delay: float, shunt: float, *, timeout: float = 5,
+                 volt_channel: DS4024.Channels = DS4024.Channels.CHANNEL2,
+                 current_channel: DS4024.Channels = DS4024.Channels.CHANNEL1, pool: BufferPool = None):
+        """Start the saving thread.
+
+        :param scope: the scope, already set up (scales, trigger...)
+        :param surge: the surge generator resource
+        :param delay: thermal delay between two shots (seconds)
+        :param shunt: value of the current shunt (Ohms)
+        :param timeout: the diode is dead if the scope has not triggered after this time (seconds)
+        :param volt_channel: scope channel of the voltage
+        :param current_channel: scope channel of the current (on the shunt)
+        :param pool: buffers for the waveforms (None for a pool of two shots)
+        """
+        self.scope = scope
+        self.surge = surge
+        self.delay = delay
+        self.shunt = shunt
+        self.timeout = timeout
+        self.volt_channel = volt_channel
+        self.current_channel = current_channel
+        self.pool = pool or BufferPool(scope.memory_depth, count=4)
+
+        self.answer = ''
+        self.__cold_at = 0
+        self.__error = None
+        self.__jobs = Queue()
+        self.__saver = Thread(target=self.__save_loop, name="SurgeSaver", daemon=True)
+        self.__saver.start()
+
+    def shot(self, read: bool = True):
+        """Wait for the end of the previous cooldown, pulse and read the waveforms.
+
+        :param read: False to only pulse (ex. to initialize the surge controller)
+        :return: the Capture (None if not read), and True if the diode is dead (the scope never triggered).
+                 The answer of the surge generator is kept in the answer attribute.
+        """
+        self.wait_cooldown()
+
+        #   # Start scope in SINGLE mode and pulse ! #  #
+        self.scope.running = True
+        self.scope.sweep = self.scope.Sweeps.SINGLE
+        tme.sleep(.5)
+        self.surge.write_raw(f"s")
+        timestamp = tme.time()
+        self.__cold_at = timestamp + self.delay
+        tme.sleep(.2)
+        self.answer = self.surge.read().strip()
+
+        #   # Wait until acquired #  #
+        while not self.scope.stopped:
+            if (timestamp + self.timeout) < tme.time():
+                return None, True
+
+        if not read:
+            return None, False
+
+        #   # Retrieve data, during the cooldown #  #
+        buffers = []
+        done = False
+        try:
+            depth = self.scope.memory_depth
+            buffers.append(self.pool.acquire(depth))
+            buffers.append(self.pool.acquire(depth))
+            volt = self.scope.capture(self.volt_channel, buffers[0])
+            current = self.scope.capture(self.current_channel, buffers[1], custom_scale=1 / self.shunt)
+            size = min(len(volt.data), len(current.data))
+            done = True
+        finally:
+            if not done:
+                # Any failure of the readout, the buffers go back to the pool
+                for buffer in buffers:
+                    self.pool.release(buffer)
+
+        return SurgePipeline.Capture(volt.time[:size], volt.data[:size], current.data[:size], timestamp,
+                                     tuple(buffers)), False
+
+    def wait_cooldown(self):
+        """Wait until the thermal delay of the last shot is over."""
+        remaining = self.__cold_at - tme.time()
+        if remaining > 0:
+            tme.sleep(remaining)
+
+    def release(self, capture: Capture):
+        """Give the buffers of a capture back to the pool, when it is not saved (saved captures are released)."""
+        for buffer in capture.buffers:
+            self.pool.release(buffer)
+
+    def save(self, function: Callable, *args, **kwargs):
+        """Queue a saving, done by the background thread in order.
+        The captures given in args are released once saved.
+
+        :param function: the saving function (ex. diode_save)
+        :raise Exception: the exception of a previous saving that failed
+        """
+        self.__raise_error()
+        self.__jobs.put((function, args, kwargs))
+
+    def flush(self):
+        """Wait until all the queued savings are done.
+
+        :raise Exception: the exception of a saving that failed
+        """
+        self.__jobs.join()
+        self.__raise_error()
+
+    def close(self):
+        """Flush the savings and stop the thread."""
+        self.__jobs.put(None)
+        self.__saver.join()
+        self.__raise_error()
+
+    def __save_loop(self):
+        while True:
+            job = self.__jobs.get()
+            try:
+                if job is None:
+                    return
+                function, args, kwargs = job
+                try:
+                    function(*args, **kwargs)
+                finally:
+                    for capture in [arg for arg in args if isinstance(arg, SurgePipeline.Capture)]:
+                        self.release(capture)
+            except Exception as e:
+                self.__error = e
+            finally:
+                self.__jobs.task_done()
+
+    def __raise_error(self):
+        if self.__error is not None:
+            error, self.__error = self.__error, None
+            raise error
@@ -45,13 +45,43 @@ PW = 300e-6
 PULSES = [x / 2 for x in range(1, 8)]
 LOW_LEVEL = -10e-3
 
+#  # Pacing of the test #  #
+# False : one trigger per pulse, each one on its own scales and at least PULSE_DELAY apart (the reference test)
+# True : the whole sweep is played by one trigger, GAP apart, to see the effect of a faster rate. Much more thermal
+#        load on the device, and all the pulses share the scales of the largest one: the vertical resolution of the
+#        smallest pulse is min(PULSES) / max(PULSES) of the others (1/7 here). The table limits GAP to about 75ms
+#        for 300us pulses (16384 points, 8 per pulse).
+SINGLE_TRIGGER = False
+PULSE_DELAY = 1  # Secs, after each pulse of the per-pulse sweep
+GAP = 10e-3  # Secs, between two pulses of the single trigger sweep
+
 PATH.mkdir(parents=True, exist_ok=True)
 
+
+def save_pulse(p, time, volt, current, cmd):
+    pulse_current = p*RATIO
+    time, volt, current, cmd = resize(time, volt, current, cmd)
+
+    rows = [[time[i] * 1e6, current[i], volt[i], cmd[i]] for i in range(len(time))]
+    filename = f"pulsed_{int(PW*1e6)}us_{p:.3}V_{int(pulse_current)}A.csv"
+    full_path = PATH / filename
+
+    with open(str(full_path.resolve()), 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file, dialect='excel', delimiter=',')
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
 # Generator setup
-fawg.set_chn_shape(CHN1, DG4062.Shapes.PULSE)
-fawg.set_chn_period(CHN1, 500e-6)
-fawg.set_chn_pulse_width(CHN1, 300e-6)
-fawg.chn_burst(CHN1, True)
+if SINGLE_TRIGGER:
+    #  # The whole sweep is uploaded once and played by one trigger #  #
+    TABLE = DG4062.compile_pulse_table([(p, PW) for p in PULSES], low=LOW_LEVEL, gap=GAP)
+    fawg.load_pulse_table(CHN1, TABLE, DG4062.TrigSources.MANUAL)
+else:
+    fawg.set_chn_shape(CHN1, DG4062.Shapes.PULSE)
+    fawg.set_chn_period(CHN1, 500e-6)
+    fawg.set_chn_pulse_width(CHN1, 300e-6)
+    fawg.chn_burst(CHN1, True)
 fawg.beep()
 
 # Scope setup
@@ -84,53 +114,79 @@ fawg.out1 = True
 
 arduino.relay_mux(arduino.Channels.SURGE)
 
-for p in PULSES:
-    pulse_current = p*RATIO
-
-    #  # Channels scale #  #
-    scope.set_chn_scale(scope.Channels.CHANNEL1, (pulse_current * SHUNT) / 6)
+if SINGLE_TRIGGER:
+    #  # Channels scale, for the highest pulse (the small ones lose resolution, see SINGLE_TRIGGER) #  #
+    max_pulse = max(PULSES)
+    scope.set_chn_scale(scope.Channels.CHANNEL1, (max_pulse * RATIO * SHUNT) / 6)
     scope.set_chn_scale(scope.Channels.CHANNEL2, MAX_VOLTAGE / 6)
-    scope.set_chn_scale(scope.Channels.CHANNEL3, p / 6)
-    scope.set_chn_offset(scope.Channels.CHANNEL1, -(pulse_current * SHUNT) / 2)
+    scope.set_chn_scale(scope.Channels.CHANNEL3, max_pulse / 6)
+    scope.set_chn_offset(scope.Channels.CHANNEL1, -(max_pulse * RATIO * SHUNT) / 2)
     scope.set_chn_offset(scope.Channels.CHANNEL2, -MAX_VOLTAGE / 2)
-    scope.set_chn_offset(scope.Channels.CHANNEL3, -p / 2)
+    scope.set_chn_offset(scope.Channels.CHANNEL3, -max_pulse / 2)
 
-    #  # Trigger #  #
-    scope.level = p / 2
+    #  # Trigger, on the smallest pulse #  #
+    scope.level = min(PULSES) / 2
 
-    fawg.set_chn_hi_lo(CHN1, p, LOW_LEVEL)
-
-    #   # Start scope in SINGLE mode and pulse ! #  #
+    #   # Record one frame per pulse, and play the table ! #  #
     scope.running = True
-    scope.sweep = scope.Sweeps.SINGLE
+    scope.record(len(PULSES), interval=GAP / 2)
     tme.sleep(.5)
-    fawg.chn_burst_trig(CHN1)
+    fawg.chn_burst_trig(CHN1, manual=False)
 
-    #   # Wait until acquired #  #
+    #   # Wait until recorded #  #
     ts = tme.time()
-    is_dead = False
-    while not scope.stopped and not is_dead:
-        if (ts + 5) < tme.time():
-            is_dead = True
-
-    if not is_dead:
-        #   # Retrieve data #  #
-        time, volt = scope.get_curve(scope.Channels.CHANNEL2)
-        _, current = scope.get_curve(scope.Channels.CHANNEL1, custom_scale=1 / SHUNT)
-        _, cmd = scope.get_curve(scope.Channels.CHANNEL3)
-        time, volt, current, cmd = resize(time, volt, current, cmd)
-
-        rows = [[time[i] * 1e6, current[i], volt[i], cmd[i]] for i in range(len(time))]
-        filename = f"pulsed_{int(PW*1e6)}us_{p:.3}V_{int(pulse_current)}A.csv"
-        full_path = PATH / filename
-
-        with open(str(full_path.resolve()), 'w', newline='') as csv_file:
-            writer = csv.writer(csv_file, dialect='excel', delimiter=',')
-            writer.writerow(COLUMNS)
-            writer.writerows(rows)
+    while scope.recording and (ts + TABLE.duration + 5) > tme.time():
+        pass
+    scope.stop_record()
+
+    #   # Retrieve data, all the frames at once #  #
+    volts = scope.get_frames(scope.Channels.CHANNEL2)
+    currents = scope.get_frames(scope.Channels.CHANNEL1, custom_scale=1 / SHUNT)
+    cmds = scope.get_frames(scope.Channels.CHANNEL3)
+
+    for p, volt, current, cmd in zip(PULSES, volts.data, currents.data, cmds.data):
+        save_pulse(p, volts.time, volt, current, cmd)
 
     fawg.beep()
-    tme.sleep(1)
+else:
+    for p in PULSES:
+        pulse_current = p*RATIO
+
+        #  # Channels scale #  #
+        scope.set_chn_scale(scope.Channels.CHANNEL1, (pulse_current * SHUNT) / 6)
+        scope.set_chn_scale(scope.Channels.CHANNEL2, MAX_VOLTAGE / 6)
+        scope.set_chn_scale(scope.Channels.CHANNEL3, p / 6)
+        scope.set_chn_offset(scope.Channels.CHANNEL1, -(pulse_current * SHUNT) / 2)
+        scope.set_chn_offset(scope.Channels.CHANNEL2, -MAX_VOLTAGE / 2)
+        scope.set_chn_offset(scope.Channels.CHANNEL3, -p / 2)
+
+        #  # Trigger #  #
+        scope.level = p / 2
+
+        fawg.set_chn_hi_lo(CHN1, p, LOW_LEVEL)
+
+        #   # Start scope in SINGLE mode and pulse ! #  #
+        scope.running = True
+        scope.sweep = scope.Sweeps.SINGLE
+        tme.sleep(.5)
+        fawg.chn_burst_trig(CHN1)
+
+        #   # Wait until acquired #  #
+        ts = tme.time()
+        is_dead = False
+        while not scope.stopped and not is_dead:
+            if (ts + 5) < tme.time():
+                is_dead = True
+
+        if not is_dead:
+            #   # Retrieve data #  #
+            time, volt = scope.get_curve(scope.Channels.CHANNEL2)
+            _, current = scope.get_curve(scope.Channels.CHANNEL1, custom_scale=1 / SHUNT)
+            _, cmd = scope.get_curve(scope.Channels.CHANNEL3)
+            save_pulse(p, time, volt, current, cmd)
+
+        fawg.beep()
+        tme.sleep(PULSE_DELAY)
 
 arduino.relay_mux(arduino.Channels.NONE)
 
@@ -0,0 +1,210 @@
+from collections import namedtuple
+from pathlib import Path
+from typing import List
+import time as tme
+
+import numpy as np
+
+
+class LiveBuffer:
+    """A memory-mapped ring buffer of the last readings of every diode.
+
+    The acquisition loop is the only writer, any number of dashboard processes can map the same file and read it.
+    There is no lock: a record is written before the counter of its diode is incremented, so readers only look at
+    complete records. The arrays returned by the attributes are views on the file, not copies.
+    """
+
+    MAGIC = b'HTRB'
+
+    HEADER = np.dtype([('magic', 'S4'), ('size', '<i4'), ('depth', '<i4'),
+                       ('start', '<f8'), ('voltage', '<f8'), ('compliance', '<f8'), ('trip_current', '<f8'),
+                       ('resistor', '<f8'), ('supply', '<f8')])
+    META = np.dtype([('name', 'S32'), ('board', 'S4')])
+    RECORD = np.dtype([('timestamp', '<f8'), ('current', '<f8'), ('voltage', '<f8'), ('cycles', '<i8'),
+                       ('alive', '?')])
+
+    Settings = namedtuple("Settings", ['start', 'voltage', 'compliance', 'trip_current', 'resistor'])
+    Settings.__doc__ = """Test settings stored in the header, used by the dashboard"""
+    Settings.start.__doc__ += """ : Timestamp of the start of the stress (s)"""
+    Settings.voltage.__doc__ += """ : Applied voltage (V)"""
+    Settings.compliance.__doc__ += """ : Current compliance of the supply (A)"""
+    Settings.trip_current.__doc__ += """ : Tripping current of a diode (A)"""
+    Settings.resistor.__doc__ += """ : Protection resistor (Ohms)"""
+
+    def __init__(self, path: Path, names: List[str] = None, boards: List[str] = None, *, depth: int = 1024,
+                 settings: Settings = None):
+        """Create (writer) or open (reader) a buffer file.
+
+        :param path: path to the buffer file
+        :param names: name of each diode, the file is created if given, else it is opened read only
+        :param boards: board of each diode (ex. 'B12'), same order as names
+        :param depth: number of readings kept for each diode (writer only)
+        :param settings: test settings stored in the header (writer only)
+        :raise ValueError: "Not a live buffer !" : the opened file was not created by a LiveBuffer.
+        """
+        path = Path(path)
+        create = names is not None
+        mode = 'w+' if create else 'r'
+
+        if create:
+            size = len(names)
+        else:
+            header = np.memmap(path, dtype=LiveBuffer.HEADER, mode='r', shape=(1,))
+            if header['magic'][0] != LiveBuffer.MAGIC:
+                raise ValueError("Not a live buffer !")
+            size, depth = int(header['size'][0]), int(header['depth'][0])
+            del header
+
+        offset = LiveBuffer.HEADER.itemsize
+        self.__header = np.memmap(path, dtype=LiveBuffer.HEADER, mode=mode, shape=(1,))
+        self.__meta = np.memmap(path, dtype=LiveBuffer.META, mode='r+' if create else 'r', offset=offset,
+                                shape=(size,))
+        offset += LiveBuffer.META.itemsize * size
+        self.__counts = np.memmap(path, dtype='<u8', mode='r+' if create else 'r', offset=offset, shape=(size,))
+        offset += 8 * size
+        self.__records = np.memmap(path, dtype=LiveBuffer.RECORD, mode='r+' if create else 'r', offset=offset,
+                                   shape=(size, depth))
+
+        if create:
+            self.__header['size'] = size
+            self.__header['depth'] = depth
+            self.__meta['name'] = [n.encode() for n in names]
+            self.__meta['board'] = [b.encode() for b in (boards or [''] * size)]
+            self.__counts[:] = 0
+            if settings is not None:
+                self.set_settings(settings)
+            # The magic is written last, so a reader never maps a half initialized file
+            self.__header['magic'] = LiveBuffer.MAGIC
+            self.__header.flush()
+
+    # ############ #
+    # ## Writer ## #
+    # ############ #
+
+    def set_settings(self, settings: Settings):
+        """Store the test settings in the header."""
+        for field, value in settings._asdict().items():
+            self.__header[field] = value
+
+    def set_supply(self, voltage: float):
+        """Store the last measured voltage of the supply."""
+        self.__header['supply'] = voltage
+
+    def write(self, index: int, current: float, voltage: float, cycles: int, alive: bool, timestamp: float = None):
+        """Append a reading of a diode.
+
+        :param index: index of the diode
+        :param current: measured current (A)
+        :param voltage: voltage across the diode (V)
+        :param cycles: number of stress cycles of the diode
+        :param alive: False once the diode tripped
+        :param timestamp: time of the reading (None for now)
+        """
+        count = int(self.__counts[index])
+        self.__records[index, count % self.depth] = (tme.time() if timestamp is None else timestamp,
+                                                     current, voltage, cycles, alive)
+        self.__counts[index] = count + 1
+
+    # ############ #
+    # ## Reader ## #
+    # ############ #
+
+    def latest(self) -> np.ndarray:
+        """Get the last record of each diode (NaN timestamp if never written)."""
+        counts = self.counts.astype(np.int64)
+        latest = self.__records[np.arange(self.size), (counts - 1) % self.depth]
+        latest['timestamp'][counts == 0] = np.nan
+        return latest
+
+    def history(self, index: int) -> np.ndarray:
+        """Get the records of a diode that are still in the buffer, oldest first."""
+        count = int(self.__counts[index])
+        records = self.__records[index]
+        if count <= self.depth:
+            return records[:count]
+        return np.roll(records, -(count % self.depth))
+
+    # ################ #
+    # ## Attributes ## #
+    # ################ #
+
+    @property
+    def size(self) -> int:
+        """Number of diodes."""
+        return int(self.__header['size'][0])
+
+    @property
+    def depth(self) -> int:
+        """Number of readings kept for each diode."""
+        return int(self.__header['depth'][0])
+
+    @property
+    def names(self) -> List[str]:
+        """Name of each diode."""
+        return [n.decode() for n in self.__meta['name']]
+
+    @property
+    def boards(self) -> List[str]:
+        """Board of each diode."""
+        return [b.decode() for b in self.__meta['board']]
+
+    @property
+    def settings(self) -> Settings:
+        """Test settings stored in the header."""
+        return LiveBuffer.Settings(*[float(self.__header[field][0]) for field in LiveBuffer.Settings._fields])
+
+    @property
+    def supply(self) -> float:
+        """Last measured voltage of the supply."""
+        return float(self.__header['supply'][0])
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Number of readings written for each diode (view)."""
+        return self.__counts
+
+    @property
+    def records(self) -> np.ndarray:
+        """All the records, one ring per diode (view)."""
+        return self.__records
+
+
+def dashboard(path: Path, refresh: float = 5):
+    """Display the HTRB state from a live buffer, in its own process and at its own pace.
+
+    :param path: path to the buffer file written by the acquisition
+    :param refresh: display period (seconds)
+    """
+    from ArduinoHTRB import ArduinoHTRB
+    from GUI import display_data
+
+    Diode = namedtuple("Diode", ['board', 'name', 'isDead', 'maxCurrent', 'minCurrent', 'lastCurrent', 'cycles'])
+
+    live = LiveBuffer(path)
+    boards = [ArduinoHTRB.Device(b) for b in live.boards]
+
+    while True:
+        settings = live.settings
+        latest = live.latest()
+
+        diodes = []
+        for i, name in enumerate(live.names):
+            # The bars show the trend over the whole buffer, not only the last cycle
+            history = live.history(i)['current']
+            if len(history) == 0:
+                continue
+            diodes.append(Diode(boards[i], name, not latest['alive'][i], history.max(), history.min(),
+                                latest['current'][i], int(latest['cycles'][i])))
+
+        if diodes:
+            display_data(settings.start, settings.voltage, settings.compliance, live.supply,
+                         settings.trip_current, settings.resistor, diodes)
+        tme.sleep(refresh)
+
+
+if __name__ == "__main__":
+    import pathlib, sys
+
+    sys.path.append(str(pathlib.Path('../_libs/').resolve()))
+
+    dashboard(Path(sys.argv[1] if len(sys.argv) > 1 else "./live.dat"))
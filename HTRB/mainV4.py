@@ -7,6 +7,10 @@ from VISA.PICOAMMETER import PICOAMMETER
 from VISA.ArduinoAlim import ArduinoAlim
 
 from ArduinoHTRB import ArduinoHTRB
+from monitor import LeakageMonitor
+from Utils.checkpoint import Checkpoint
+from Utils.catalog import Catalog
+from live_data import LiveBuffer
 
 import time as tme
 from datetime import datetime
@@ -24,8 +28,7 @@ vc = VisaController(query='?*::INSTR', verbose=True)
 #xr8000 = XR8000(inst)
 inst = vc.get_instruments_by_name(ArduinoAlim.NAME)[0]
 alim = ArduinoAlim(inst)
-inst = vc.get_instruments_by_name(PICOAMMETER.NAME)[0]
-pico = PICOAMMETER(inst)
+picos = vc.get_pool(PICOAMMETER)  # The characterization is spread over all the picoammeters, by serial number
 inst = vc.get_instruments_by_name(ArduinoHTRB.NAME)[0]
 arduino = ArduinoHTRB(inst)
 Diodes = ArduinoHTRB.Device
@@ -35,6 +38,13 @@ Diodes = ArduinoHTRB.Device
 # ######## #
 PATH = pathlib.Path("./csv")
 PATH_CARAC = pathlib.Path("./csv_carac")
+PATH_LIVE = pathlib.Path("./live.dat")  # Read by 'python live_data.py' to display the test
+PATH_CHECKPOINT = pathlib.Path("./checkpoint.json")  # Delete it to start a new test instead of resuming
+
+checkpoint = Checkpoint(PATH_CHECKPOINT)
+catalog = Catalog.open(PATH)  # Index of the readings, each one at its offset in the csv of the diode
+catalog_carac = Catalog.open(PATH_CARAC)
+RESUME = checkpoint.load()  # State of the crashed test, None for a new test
 
 DIODE_LIST = [
     [Diodes.B1, 'B1_87'],
@@ -50,6 +60,22 @@ DIODE_LIST = [
     [Diodes.B11, 'B11_25'],
     [Diodes.B12, 'B12_15']]
 
+#  # Picoammeter wired to the measure line of each board (index in picos, ordered by serial number) #  #
+#  # Boards on different picoammeters are characterized at the same time #  #
+DIODE_METERS = {
+    Diodes.B1: 0,
+    Diodes.B2: 0,
+    Diodes.B3: 0,
+    Diodes.B4: 0,
+    Diodes.B5: 0,
+    Diodes.B6: 0,
+    Diodes.B7: 0,
+    Diodes.B8: 0,
+    Diodes.B9: 0,
+    Diodes.B10: 0,
+    Diodes.B11: 0,
+    Diodes.B12: 0}
+
 DIODE_VOLTAGE = 1200 * 0.8
 DIODE_MAX_CURRENT = 200e-6
 DIODE_NORMAL_CURRENT = 100e-6
@@ -58,6 +84,7 @@ DIODE_VOLTAGE = DIODE_VOLTAGE + DIODE_NORMAL_CURRENT * PROTECTION_RESISTOR
 DIODE_CURRENT_COMPLIANCE = 20e-3  # DIODE_MAX_CURRENT * len(DIODE_LIST) + DIODE_VOLTAGE/PROTECTION_RESISTOR
 
 MEASURE_PERIOD = 60  # seconds
+SUPPLY_POLL_PERIOD = 1  # seconds
 
 MEASURE_INTER = []
 j = 66
@@ -80,6 +107,11 @@ for i in range(123):
     list_voltage.append(volt)
     volt += 10
 
+for board, meter in DIODE_METERS.items():
+    if meter >= len(picos):
+        raise ValueError(f"{board.name} is wired to the picoammeter {meter}, only {len(picos)} connected !")
+
+print("Picoammeters : ", ", ".join(sorted(instr.idn.sn for instr in vc.get_instruments_by_name(PICOAMMETER.NAME))))
 print("High Voltage value : ", DIODE_VOLTAGE)
 print("Current compliance : ", DIODE_CURRENT_COMPLIANCE)
 print("Tripping current : ", DIODE_MAX_CURRENT)
@@ -96,9 +128,35 @@ DIODES = []
 for diode in DIODE_LIST:
     DIODES.append(Diode(*diode, False, -1, 1, 0, 0))
 
-    filepath = PATH / ('diode_' + diode[1] + '.csv')
-    header = pd.DataFrame(columns=COLUMNS)
-    header.to_csv(filepath, mode='a', index=False, header=True)
+    if RESUME is None:
+        filepath = PATH / ('diode_' + diode[1] + '.csv')
+        header = pd.DataFrame(columns=COLUMNS)
+        header.to_csv(filepath, mode='a', index=False, header=True)
+
+if RESUME is not None:
+    print(f"Resuming the test started on {datetime.fromtimestamp(RESUME['start'])}")
+    DIODES = [Diode(Diodes[d[0]], *d[1:]) for d in RESUME['diodes']]
+    indice_carac = RESUME['indice_carac']
+
+
+#  # Protection, the board is disabled on the reading that crossed the limit #  #
+def trip(index, current):
+    print(f"Over current on {DIODES[index].name} : {current * 1e6}uA")
+    delay = arduino.enable(DIODES[index].board, False)
+    tme.sleep(delay + .5)
+
+
+monitor = LeakageMonitor([diode.name for diode in DIODES], DIODE_MAX_CURRENT,
+                         supply_threshold=DIODE_VOLTAGE * 0.8, on_trip=trip)
+live = LiveBuffer(PATH_LIVE, [diode.name for diode in DIODES], [diode.board.value for diode in DIODES])
+if RESUME is not None:
+    monitor.set_state(RESUME['monitor'])
+
+
+def save_checkpoint():
+    checkpoint.save({'start': START_TIMESTAMP, 'indice_carac': indice_carac, 'monitor': monitor.get_state(),
+                     'diodes': [[d.board.name, d.name, bool(d.isDead), float(d.maxCurrent), float(d.minCurrent),
+                                 float(d.lastCurrent), int(d.cycles)] for d in DIODES]})
 
 # ######## #
 # Main App #
@@ -115,16 +173,16 @@ try:
     alim.output_relay(False)
     re_enable_alim = False
 
-    #  # Picoammeter #  #
-    pico.zero_check = False
-    pico.zero_correction = False
-    pico.arm_count = 1
-    pico.trig_count = 1
-    pico.auto_range = True
+    #  # Picoammeters #  #
+    picos.set_all('zero_check', False)
+    picos.set_all('zero_correction', False)
+    picos.set_all('arm_count', 1)
+    picos.set_all('trig_count', 1)
+    picos.set_all('auto_range', True)
 
-    #  # Boards #  #
+    #  # Boards, dead diodes of a resumed test stay disabled #  #
     for diode in DIODES:
-        delay = arduino.enable(diode.board, True)
+        delay = arduino.enable(diode.board, not diode.isDead)
         tme.sleep(delay + .5)
 
     # ##### #
@@ -136,7 +194,13 @@ try:
     alim.output_relay(True)
     arduino.red(True)
 
+    #  # The time the rig was down is not stress time, the start is shifted by the outage #  #
     START_TIMESTAMP = tme.time()
+    if RESUME is not None:
+        print(f"Resumed after {(START_TIMESTAMP - RESUME['saved']) / 3600:.2f}h without HV")
+        START_TIMESTAMP = RESUME['start'] + (START_TIMESTAMP - RESUME['saved'])
+    live.set_settings(LiveBuffer.Settings(START_TIMESTAMP, DIODE_VOLTAGE, DIODE_CURRENT_COMPLIANCE,
+                                          DIODE_MAX_CURRENT, PROTECTION_RESISTOR))
 
     stop = False
     while not stop:
@@ -164,63 +228,61 @@ try:
                 tme.sleep(delay + 0.5)
             
             #  # Pico Param #  #
-            pico.auto_range = False
+            picos.set_all('auto_range', False)
             
-            for diodes in DIODES:
-                print(f"IdeV en cours sur {diodes.name}")
-                pico.range = 2.1e-07
+            #  # Tripped diodes are never biased again #  #
+            alive = [diodes for diodes in DIODES if not diodes.isDead]
+            
+            #  # One diode per picoammeter at the same time, on the same voltage sweep #  #
+            for slots in picos.batches(alive, lambda diodes: DIODE_METERS[diodes.board]):
+                batch = [diodes for diodes in slots if diodes is not None]
+                print(f"IdeV en cours sur {', '.join(diodes.name for diodes in batch)}")
                 alim.input_relay(True)
                 save_time = tme.time() #  Unique timestamp, simpler. # (tme.time() - START_TIMESTAMP) + 66*3600
-                filepath_carac = PATH_CARAC / ('diode_' + diodes.name + '_' + str(round(save_time)) + '.csv')
-                header_carac = pd.DataFrame(columns=COLUMNS_CARAC)
-                header_carac.to_csv(filepath_carac, mode='a', index=False, header=True)
-                
-                delay = arduino.enable(diodes.board, True)
-                tme.sleep(delay + 0.5)
-                
-                delay = arduino.measure(diodes.board, True)
-                tme.sleep(delay + .5)
-                
-                
-                for voltage in list_voltage:
-                    #  # Step voltage from list #  # 
-                    alim.manu_rampe_voltage(voltage)
-                    tme.sleep(0.1)
+                filepaths_carac = {}
+                for diodes in batch:
+                    filepath_carac = PATH_CARAC / ('diode_' + diodes.name + '_' + str(round(save_time)) + '.csv')
+                    header_carac = pd.DataFrame(columns=COLUMNS_CARAC)
+                    header_carac.to_csv(filepath_carac, mode='a', index=False, header=True)
+                    catalog_carac.add(filepath_carac, diode=diodes.name, test='htrb_carac', timestamp=save_time)
+                    filepaths_carac[diodes.name] = filepath_carac
                     
-                    #  # Read current and voltage #  #
-                    volt_carac = alim.voltage()
-                    tme.sleep(0.1)
-                    data_carac = pico.read()[0]
+                    delay = arduino.enable(diodes.board, True)
+                    tme.sleep(delay + 0.5)
                     
-                    #  # Homemande Auto-range #  #
-                    if(data_carac.current == 9.9e+37):
-                        if(pico.range == 2.1e-07):
-                            pico.range = 0.00002
-                        elif(pico.range == 2.1e-5): 
-                            pico.range = 0.0002 
-                        elif(pico.range == 2.1e-4):
-                            pico.range = 0.002
-                        #  # Re-read current value due to overflow #  #
-                        data_carac = pico.read()[0]
+                    delay = arduino.measure(diodes.board, True)
+                    tme.sleep(delay + .5)
+                
+                for p in picos:
+                    p.reset_autorange(2.1e-07)
+                
+                #  # Step voltage from list, read all the currents once settled, after the charging current #  #
+                for point in alim.ramp(settle=0.2).sweep(list_voltage, lambda: picos.all('predictive_read')):
+                    volt_carac = point.voltage
                     
                     #  # Save data in csv #  #
-                    df_carac = pd.DataFrame(columns=COLUMNS_CARAC, data=[[round(tme.time()-START_TIMESTAMP) , volt_carac, data_carac.current]])
-                    df_carac.to_csv(filepath_carac, mode='a', index=False, header=False)
+                    for diodes, data_carac in zip(slots, point.reading):
+                        if diodes is None:
+                            continue
+                        filepath_carac = filepaths_carac[diodes.name]
+                        df_carac = pd.DataFrame(columns=COLUMNS_CARAC, data=[[round(tme.time()-START_TIMESTAMP) , volt_carac, data_carac.current]])
+                        df_carac.to_csv(filepath_carac, mode='a', index=False, header=False)
                     
                 
                 alim.set_output_voltage(0)
                 tme.sleep(4)
-                delay = arduino.measure(diodes.board, False)
-                tme.sleep(delay + 0.5)
-                delay = arduino.enable(diodes.board, False)
-                tme.sleep(delay + 0.5)
+                for diodes in batch:
+                    delay = arduino.measure(diodes.board, False)
+                    tme.sleep(delay + 0.5)
+                    delay = arduino.enable(diodes.board, False)
+                    tme.sleep(delay + 0.5)
             
-            #  # Enable HV on all boards #  #
-            for diodes in DIODES:
+            #  # Enable HV on all the living boards #  #
+            for diodes in alive:
                 delay = arduino.enable(diodes.board, True)
                 tme.sleep(delay + 0.5)
                
-            pico.auto_range = True
+            picos.set_all('auto_range', True)
             indice_carac += 1
             re_enable_alim = True
         
@@ -234,13 +296,14 @@ try:
             re_enable_alim = False
         
         
-        for diode in DIODES:
+        for i, diode in enumerate(DIODES):
 
             diode_board = diode.board
             diode_name = diode.name
             
 
             if diode.isDead:
+                DIODES_TEMP.append(diode)  # Kept for the index of the monitor and the checkpoint, never biased
                 tme.sleep(4)
             else:
                 # ########### #
@@ -250,7 +313,7 @@ try:
                 delay = arduino.measure(diode_board, True)
                 tme.sleep(delay + .5)
 
-                data = pico.read()[0]
+                data = picos.drivers[DIODE_METERS[diode_board]].read()[0]
 
                 delay = arduino.measure(diode_board, False)
                 tme.sleep(delay + .5)
@@ -259,38 +322,38 @@ try:
                 # Protection #
                 # ########## #
 
-                over_current = False
-                if data.current > DIODE_MAX_CURRENT:
-                    over_current = True
-                    delay = arduino.enable(diode_board, False)
-                    tme.sleep(delay + .5)
+                over_current = monitor.push(i, data.current)
 
                 # ###### #
                 # Saving #
                 # ###### #
 
-                lastCurrent = data.current
-                maxCurrent = max(data.current, diode.maxCurrent)  # Args order matters !
+                maxCurrent = max(data.current, diode.maxCurrent)  # Whole test, the monitor only keeps a window
                 minCurrent = min(data.current, diode.minCurrent)
-                cycles = diode.cycles + 1
-
-                diode_temp = Diode(diode_board, diode_name, over_current, maxCurrent, minCurrent, lastCurrent, cycles)
+                diode_temp = Diode(diode_board, diode_name, over_current, maxCurrent, minCurrent, data.current,
+                                   int(monitor.cycles[i]))
                 DIODES_TEMP.append(diode_temp)
 
-                diode_voltage = alim.voltage() - data.current * PROTECTION_RESISTOR
                 alim_voltage = alim.voltage()
+                diode_voltage = alim_voltage - data.current * PROTECTION_RESISTOR
+                global_over_current |= monitor.push_supply(alim_voltage)
+                live.write(i, data.current, diode_voltage, diode_temp.cycles, not over_current)
+                live.set_supply(alim_voltage)
                 if (not global_over_current) or over_current:
                     print("Pico reading (", diode, ") :", data.current*1e6 ,"uA ","Actual Voltage = ", alim.voltage(), "V")
                     filepath = PATH / ('diode_' + diode_name + '.csv')
+                    offset = filepath.stat().st_size
                     df = pd.DataFrame(columns=COLUMNS,
                                       data=[[round(tme.time()), data.timestamp, data.current, diode_voltage, alim_voltage, str(data.status),
                                              diode_temp.cycles]])
                     df.to_csv(filepath, mode='a', index=False, header=False)
+                    catalog.add(filepath, diode=diode_name, test='htrb', burned=over_current, offset=offset, rows=1)
                     
                 
                 
                 
         DIODES = DIODES_TEMP
+        save_checkpoint()
         
         # ######################### #
         # Delay to next measurement #
@@ -298,12 +361,12 @@ try:
 
         global_over_current = False
         start = tme.time()
-        compliance_detection = alim.voltage()
         while ((start + MEASURE_PERIOD) > tme.time()) and not global_over_current:
-            if compliance_detection < DIODE_VOLTAGE * 0.8 :
-                global_over_current = True
-            else:
-                tme.sleep(5)
+            alim_voltage = alim.voltage()
+            live.set_supply(alim_voltage)
+            global_over_current = monitor.push_supply(alim_voltage)
+            if not global_over_current:
+                tme.sleep(SUPPLY_POLL_PERIOD)
 
         stop = all([diode.isDead for diode in DIODES])
 
@@ -326,3 +389,4 @@ else:
     alim.input_relay(False)
     arduino.orange(False)
     arduino.red(False)
+    checkpoint.clear()
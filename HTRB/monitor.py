@@ -0,0 +1,203 @@
+from typing import List, Callable
+import time as tme
+
+import numpy as np
+
+
+class LeakageMonitor:
+    """Keep rolling statistics of the leakage current of every diode, and trip as soon as a sample crosses a limit.
+
+    Each diode has a fixed-size ring buffer of its last readings (current and timestamp).
+    Minimum, maximum, EWMA and slope are computed over this window, for all the diodes at once.
+    The trip checks run on every pushed sample, so the protection callback is called on the sample that crossed the
+    threshold, and not at the next cycle.
+    """
+
+    def __init__(self, names: List[str], trip_current: float, *, depth: int = 256, alpha: float = .1,
+                 slope_limit: float = None, supply_threshold: float = None,
+                 on_trip: Callable[[int, float], None] = None, on_supply_fault: Callable[[float], None] = None):
+        """Initialize the buffers.
+
+        :param names: name of each diode, the index in this list is used everywhere else
+        :param trip_current: a reading above this current trips the diode (Amps)
+        :param depth: number of readings kept for each diode
+        :param alpha: smoothing factor of the EWMA (between 0 and 1)
+        :param slope_limit: a current rising faster than this trips the diode too (Amps/s, None to disable)
+        :param supply_threshold: a supply voltage below this is a compliance fault (Volts, None to disable)
+        :param on_trip: called with (index, current) the first time a diode trips
+        :param on_supply_fault: called with the voltage each time the supply is found in compliance
+        """
+        self.names = list(names)
+        self.trip_current = trip_current
+        self.alpha = alpha
+        self.slope_limit = slope_limit
+        self.supply_threshold = supply_threshold
+        self.on_trip = on_trip
+        self.on_supply_fault = on_supply_fault
+
+        size = len(self.names)
+        self.__currents = np.full((size, depth), np.nan)
+        self.__times = np.full((size, depth), np.nan)
+        self.__heads = np.zeros(size, dtype=int)
+        self.__cycles = np.zeros(size, dtype=int)
+        self.__last = np.full(size, np.nan)
+        self.__ewma = np.full(size, np.nan)
+        self.__tripped = np.zeros(size, dtype=bool)
+
+    def index(self, name: str) -> int:
+        """Get the index of a diode from its name."""
+        return self.names.index(name)
+
+    def push(self, index: int, current: float, timestamp: float = None) -> bool:
+        """Store a reading of one diode, then check it.
+
+        :param index: index of the diode
+        :param current: the reading (Amps)
+        :param timestamp: time of the reading (seconds, None for now)
+        :return: True if the diode is over the limits
+        """
+        idx = np.array([index])
+        self.__store(idx, np.array([current], dtype=float), tme.time() if timestamp is None else timestamp)
+        return bool(self.__check(idx)[0])
+
+    def push_all(self, currents, timestamp: float = None, mask=None) -> np.ndarray:
+        """Store a reading of every diode (or of the masked ones), then check them all at once.
+
+        :param currents: the readings, one per diode (Amps)
+        :param timestamp: time of the readings (seconds, None for now)
+        :param mask: boolean array selecting the diodes that were read (None for all)
+        :return: a boolean array, True for each diode over the limits
+        """
+        currents = np.asarray(currents, dtype=float)
+        idx = np.arange(len(self.names)) if mask is None else np.flatnonzero(mask)
+        self.__store(idx, currents[idx], tme.time() if timestamp is None else timestamp)
+
+        over = np.zeros(len(self.names), dtype=bool)
+        over[idx] = self.__check(idx)
+        return over
+
+    def push_supply(self, voltage: float) -> bool:
+        """Check a reading of the supply voltage.
+
+        :param voltage: the measured voltage (Volts)
+        :return: True if the supply is in compliance
+        """
+        fault = self.supply_threshold is not None and voltage < self.supply_threshold
+        if fault and self.on_supply_fault is not None:
+            self.on_supply_fault(voltage)
+        return fault
+
+    def get_state(self) -> dict:
+        """Get all the buffers and statistics, as JSON-able lists (see set_state)."""
+        return {'currents': self.__currents.tolist(), 'times': self.__times.tolist(), 'heads': self.__heads.tolist(),
+                'cycles': self.__cycles.tolist(), 'last': self.__last.tolist(), 'ewma': self.__ewma.tolist(),
+                'tripped': self.__tripped.tolist()}
+
+    def set_state(self, state: dict):
+        """Restore the buffers and statistics saved by get_state (ex. when resuming a test).
+
+        :raise ValueError: "State does not match the monitor !" : the number of diodes or the depth is not the same.
+        """
+        if np.shape(state['currents']) != self.__currents.shape:
+            raise ValueError("State does not match the monitor !")
+
+        self.__currents[:] = state['currents']
+        self.__times[:] = state['times']
+        self.__heads[:] = state['heads']
+        self.__cycles[:] = state['cycles']
+        self.__last[:] = state['last']
+        self.__ewma[:] = state['ewma']
+        self.__tripped[:] = state['tripped']
+
+    def __store(self, idx: np.ndarray, currents: np.ndarray, timestamp: float):
+        heads = self.__heads[idx]
+        self.__currents[idx, heads] = currents
+        self.__times[idx, heads] = timestamp
+        self.__heads[idx] = (heads + 1) % self.__currents.shape[1]
+        self.__cycles[idx] += 1
+
+        ewma = self.__ewma[idx]
+        self.__ewma[idx] = np.where(np.isnan(ewma), currents, self.alpha * currents + (1 - self.alpha) * ewma)
+        self.__last[idx] = currents
+
+    def __check(self, idx: np.ndarray) -> np.ndarray:
+        over = self.__last[idx] > self.trip_current
+        if self.slope_limit is not None:
+            over |= self.__slope(idx) > self.slope_limit
+
+        new = over & ~self.__tripped[idx]
+        self.__tripped[idx] |= over
+        if self.on_trip is not None:
+            for i in idx[new]:
+                self.on_trip(int(i), float(self.__last[i]))
+
+        return over
+
+    def __slope(self, idx: np.ndarray) -> np.ndarray:
+        """Least squares slope of the current over the window (Amps/s), 0 when there is not enough points."""
+        currents = self.__currents[idx]
+        times = self.__times[idx]
+
+        count = np.sum(~np.isnan(currents), axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dt = times - (np.nansum(times, axis=1) / count)[:, None]
+            dc = currents - (np.nansum(currents, axis=1) / count)[:, None]
+            slope = np.nansum(dt * dc, axis=1) / np.nansum(dt * dt, axis=1)
+
+        return np.where((count > 1) & np.isfinite(slope), slope, 0)
+
+    # ################ #
+    # ## Attributes ## #
+    # ################ #
+
+    @property
+    def last(self) -> np.ndarray:
+        """Last reading of each diode (NaN if never read)."""
+        return self.__last.copy()
+
+    @property
+    def minimum(self) -> np.ndarray:
+        """Minimum reading of each diode over the window (NaN if never read)."""
+        with np.errstate(invalid='ignore'):
+            return np.fmin.reduce(self.__currents, axis=1)
+
+    @property
+    def maximum(self) -> np.ndarray:
+        """Maximum reading of each diode over the window (NaN if never read)."""
+        with np.errstate(invalid='ignore'):
+            return np.fmax.reduce(self.__currents, axis=1)
+
+    @property
+    def ewma(self) -> np.ndarray:
+        """Exponentially weighted moving average of each diode (NaN if never read)."""
+        return self.__ewma.copy()
+
+    @property
+    def slope(self) -> np.ndarray:
+        """Trend of each diode over the window (Amps/s)."""
+        return self.__slope(np.arange(len(self.names)))
+
+    @property
+    def cycles(self) -> np.ndarray:
+        """Number of readings of each diode."""
+        return self.__cycles.copy()
+
+    @property
+    def tripped(self) -> np.ndarray:
+        """True for each diode that went over the limits at least once."""
+        return self.__tripped.copy()
+
+
+if __name__ == "__main__":
+    tripped = []
+    monitor = LeakageMonitor([f"D{i}" for i in range(12)], 200e-6, depth=16, slope_limit=1e-6,
+                             on_trip=lambda i, c: tripped.append((i, c)))
+
+    start = tme.time()
+    for cycle in range(20):
+        readings = np.full(12, 10e-6)
+        readings[3] = 10e-6 + cycle * 15e-6  # Runaway diode
+        monitor.push_all(readings, timestamp=start + cycle * 60)
+
+    print(tripped)
+    print(monitor.maximum, monitor.slope, monitor.tripped, sep='\n')
@@ -0,0 +1,230 @@
+"""Convert the legacy csv results to a compressed columnar archive, indexed by a Catalog.
+
+Each csv becomes a ``.npz`` file (one array per column, the names and units of the columns, and the origin of the
+file) at the same place in the archive tree, under the project and the name of its results folder
+(``Carac/csv``, ``HTRB/csv_carac``...)::
+
+    python archive.py ../../Carac/csv ../../CLD_Burn/csv ../../HTRB/csv ../../HTRB/csv_carac -o D:/archive -j 0
+
+The records are described from their paths, as written by the test programs:
+ * ``<diode>/<Surge|Direct|Reverse|VI>/<name>_..._<amp>A_<temp>C[_<repetition>].csv`` (Carac)
+ * ``<diode>/<diode>_features.csv`` (features of the surge shots, see Carac/surge_features.py)
+ * ``diode_<name>.csv`` and ``diode_<name>_<timestamp>.csv`` (HTRB readings and characterizations)
+ * ``<name>_LCH..._search.csv`` (trace of a pulse width search, see CLD_Burn/pw_search.py)
+ * any other csv is a CLD pulse, ``<name>_LCH..._<temp>C_..._<pw>us_<surge>A-<nominal>A[_BURNED].csv``
+
+The conversion runs on all the cores and is idempotent: a file already converted from the same source (same size and
+modification time) is skipped, so an interrupted conversion is resumed by running it again. Every converted file is
+read back and compared to the csv values before it replaces the previous version.
+
+Columns are read back with ``read_archive``::
+
+    columns, units, data = read_archive(Path("D:/archive/Carac/csv/D1/Surge/D1_surge_60A_25C.npz"))
+"""
+import argparse
+import csv
+import json
+import os
+import pathlib
+import re
+import sys
+import time as tme
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from Utils.catalog import Catalog
+
+CARAC_TESTS = ['surge', 'direct', 'reverse', 'vi']
+CARAC_NAME = re.compile(r'_(?P<amp>-?[\d.]+)A_(?P<temp>-?[\d.]+)C(?:_(?P<repetition>\d+))?$')
+HTRB_NAME = re.compile(r'^diode_(?P<diode>.+?)(?:_(?P<timestamp>\d{9,}))?$')
+CLD_NAME = re.compile(r'_(?P<temp>-?\d+)C_.*_(?P<pw>[\d.]+)us_(?P<amp>[\d.]+)A-[\d.]+A(?P<burned>_BURNED)?$')
+
+
+def describe(relative: pathlib.Path, mtime: float) -> Dict:
+    """Get the catalog values of a legacy csv from its path.
+
+    :param relative: path of the csv in its results folder
+    :param mtime: modification time of the csv (s, epoch), used when the name has no timestamp
+    :return: the keyword arguments of Catalog.add (but path)
+    """
+    stem = relative.stem
+    parts = relative.parts
+
+    if len(parts) == 3 and parts[1].lower() in CARAC_TESTS:
+        match = CARAC_NAME.search(stem)
+        values = dict(diode=parts[0], test=parts[1].lower(), timestamp=mtime)
+        if match:
+            values.update(amp=float(match['amp']), temp=float(match['temp']),
+                          repetition=None if match['repetition'] is None else int(match['repetition']))
+        return values
+
+    if len(parts) == 2 and stem == f"{parts[0]}_features":
+        return dict(diode=parts[0], test='surge_features', timestamp=mtime)
+
+    match = HTRB_NAME.match(stem)
+    if match:
+        if match['timestamp'] is None:
+            return dict(diode=match['diode'], test='htrb', timestamp=mtime)
+        return dict(diode=match['diode'], test='htrb_carac', timestamp=float(match['timestamp']))
+
+    if stem.endswith('_search'):
+        return dict(diode=stem.split('_LCH')[0], test='cld_search', timestamp=mtime)
+
+    match = CLD_NAME.search(stem)
+    if match:
+        return dict(diode=stem.split('_LCH')[0], test='cld', amp=float(match['amp']), temp=float(match['temp']),
+                    pulse_width=float(match['pw']) * 1e-6, burned=match['burned'] is not None, timestamp=mtime)
+    return dict(diode=stem.rsplit('_', 1)[0], test='cld', timestamp=mtime)
+
+
+def read_csv(path: pathlib.Path) -> Tuple[List[str], List[str], List[np.ndarray]]:
+    """Read a legacy csv.
+
+    The header is repeated in the files that were appended to by several runs, these copies are dropped. A second
+    header row of units (save_cld) is kept apart. Numeric columns are float64 (nan for empty cells), others str.
+
+    :return: the names of the columns, their units ([] if none) and the columns
+    """
+    with open(path, 'r', newline='') as csv_file:
+        rows = [row for row in csv.reader(csv_file) if row]
+
+    columns, rows = rows[0], [row for row in rows[1:] if row != rows[0]]
+    units = []
+    if rows and not any(_is_number(v) for v in rows[0]):
+        units, rows = rows[0], rows[1:]
+
+    data = []
+    for i in range(len(columns)):
+        values = [row[i] if i < len(row) else '' for row in rows]
+        if all(v == '' or _is_number(v) for v in values):
+            data.append(np.array([float(v) if v != '' else np.nan for v in values], dtype=np.float64))
+        else:
+            data.append(np.array(values, dtype=str))
+    return columns, units, data
+
+
+def read_archive(path: pathlib.Path) -> Tuple[List[str], List[str], Dict[str, np.ndarray]]:
+    """Read a converted file.
+
+    :return: the names of the columns, their units ([] if none) and the columns by name
+    """
+    with np.load(path) as arrays:
+        columns = [str(c) for c in arrays['columns']]
+        return columns, [str(u) for u in arrays['units']], {name: arrays[f'c{i}'] for i, name in enumerate(columns)}
+
+
+def convert_file(source: pathlib.Path, relative: pathlib.Path, destination: pathlib.Path) -> Tuple[str, Dict]:
+    """Convert a csv, unless it was already converted from the same source.
+
+    :param source: the csv
+    :param relative: path of the csv in its results folder
+    :param destination: the .npz file
+    :return: 'skipped' or 'converted', and the catalog values of the record
+    """
+    stat = source.stat()
+    origin = dict(source=str(source), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+    if destination.is_file():
+        with np.load(destination) as arrays:
+            done = json.loads(str(arrays['origin']))
+            rows = len(arrays['c0']) if 'c0' in arrays else 0
+        if done == origin:
+            return 'skipped', dict(describe(relative, stat.st_mtime), rows=rows)
+
+    columns, units, data = read_csv(source)
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temp = destination.with_name(destination.name + '.tmp.npz')
+    np.savez_compressed(temp, columns=np.array(columns, dtype=str), units=np.array(units, dtype=str),
+                        origin=json.dumps(origin), **{f'c{i}': column for i, column in enumerate(data)})
+
+    #  # Round trip: every value must read back as it was read from the csv #  #
+    read_columns, read_units, read_data = read_archive(temp)
+    same = read_columns == columns and read_units == units and all(
+        column.dtype == read.dtype and np.array_equal(column, read, equal_nan=column.dtype.kind == 'f')
+        for column, read in zip(data, read_data.values()))
+    if not same:
+        temp.unlink()
+        raise ValueError(f"Round trip failed : {source}")
+    os.replace(temp, destination)  # Atomic, an interrupted conversion never leaves a partial file
+
+    return 'converted', dict(describe(relative, stat.st_mtime), rows=len(data[0]) if data else 0)
+
+
+def convert(sources: List[pathlib.Path], output: pathlib.Path, jobs: int = 0, verbose: bool = False) -> Dict[str, int]:
+    """Convert results folders, and add every converted file to the catalog of the archive.
+
+    :param sources: the results folders (ex. Carac/csv), each one converted to output/<project>/<folder name>
+    :param output: the archive folder
+    :param jobs: number of processes, 0 for one per CPU
+    :param verbose: print each file
+    :return: the number of files per status (converted, skipped, failed)
+    :raise ValueError: if two results folders would be converted to the same place
+    """
+    prefixes = {}
+    for source in sources:
+        prefix = pathlib.Path(source.parent.name, source.name)
+        if prefixes.setdefault(prefix, source) != source:
+            raise ValueError(f"{prefixes[prefix]} and {source} would both be converted to {output / prefix}")
+
+    catalog = Catalog.open(output)
+    counts = {'converted': 0, 'skipped': 0, 'failed': 0}
+    start = tme.time()
+
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        futures = {}
+        for prefix, source in prefixes.items():
+            for file in sorted(source.rglob('*.csv')):
+                relative = file.relative_to(source)
+                destination = output / prefix / relative.with_suffix('.npz')
+                futures[executor.submit(convert_file, file, relative, destination)] = destination
+
+        for future in as_completed(futures):
+            destination = futures[future]
+            try:
+                status, values = future.result()
+            except Exception as e:
+                status = 'failed'
+                print(f"{destination} : {e}")
+            else:
+                catalog.add(destination, **values)
+                if verbose:
+                    print(f"{destination} : {status}")
+            counts[status] += 1
+
+    print(f"{counts['converted']} converted, {counts['skipped']} skipped, {counts['failed']} failed "
+          f"in {tme.time() - start:.1f}s")
+    return counts
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sources', nargs='+', help='results folders (ex. Carac/csv HTRB/csv_carac)')
+    parser.add_argument('-o', '--output', dest='output', required=True,
+                        help='archive folder, the catalog is written there')
+    parser.add_argument('-j', '--jobs', dest='jobs', default=0, metavar='N', type=int,
+                        help='convert N files at the same time, 0 for one per CPU [0]')
+    parser.add_argument('-v', '--verbose', dest='verbose', default=False, action='store_true',
+                        help='print each file')
+
+    args = parser.parse_args(argv)
+
+    counts = convert([pathlib.Path(s).resolve() for s in args.sources], pathlib.Path(args.output).resolve(),
+                     args.jobs, args.verbose)
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
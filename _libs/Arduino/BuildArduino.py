@@ -19,12 +19,23 @@
 #
 
 import argparse
+import hashlib
+import io
+import json
+import os
 import pathlib
+import re
 import subprocess
 import shutil
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 BUILD_DIR_NAME = '.build'
+CACHE_DIR = pathlib.Path.home() / '.build_arduino'
+MANIFEST_NAME = 'manifest.json'
+CORE_ARCHIVE_NAME = 'core.a'
+HEX_STORE_NAME = 'hex'
 
 EXITCODE_OK = 0
 EXITCODE_NO_UPLOAD_DEVICE = 1
@@ -75,30 +86,140 @@ def check_dir(dir_str: str, exitcode: int, exitstring: str, must_exist: bool = T
     return path
 
 
-def _print_separator(sep='=', title='', default_width=100):
-    import os
-
+def _print_separator(sep='=', title='', default_width=100, file=None):
     try:
         width = os.get_terminal_size().columns or default_width
     except OSError:
         width = default_width
-    print(f'{title:{sep}^{width}}')
+    print(f'{title:{sep}^{width}}', file=file)
 
 
-def _exec(cmd: list, *, debug=True, valid_exitcode=0, simulate=False):
+def _exec(cmd: list, *, debug=True, valid_exitcode=0, simulate=False, out=None):
     if debug or simulate:
-        _print_separator()
-        print(cmd)
+        _print_separator(file=out)
+        print(cmd, file=out)
     if not simulate:
-        exitdata = subprocess.run(cmd)
+        if out is None:
+            exitdata = subprocess.run(cmd)
+        else:
+            # Collect the tool output with the rest of the messages, so parallel jobs don't mix their lines
+            exitdata = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+            out.write(exitdata.stdout)
         if exitdata.returncode != valid_exitcode:
-            _print_separator(title=f'exitcode {exitdata.returncode}', sep='-')
+            _print_separator(title=f'exitcode {exitdata.returncode}', sep='-', file=out)
             raise Exception(f"Callable error ({exitdata.returncode}) : {exitdata}")
 
 
+def tree_hash(directories: list, *keys) -> str:
+    """Hash the content of every source file of the given directories (not recursive, like compile_directory).
+
+    :param directories: is a list of Path of all the *directories* used by the build
+    :param keys: are extra values that change the output (board, clock, ...)
+
+    :return: the hexadecimal digest
+    """
+
+    sha = hashlib.sha1()
+    for key in keys:
+        sha.update(f'{key}\0'.encode())
+
+    for directory in directories:
+        for filename in sorted(directory.iterdir()):
+            # Skip the .cpp copies of the .ino files left by an interrupted build
+            transformed = filename.suffix == '.cpp' and filename.with_suffix('.ino').exists()
+            if filename.is_file() and filename.suffix in COMPILERS and not transformed:
+                sha.update(f'{filename.name}\0'.encode())
+                sha.update(filename.read_bytes())
+
+    return sha.hexdigest()
+
+
+class ObjectCache:
+    """Remember how every object of a build folder was made, so unchanged objects are not compiled again.
+
+    An object is reused when its compile flags are the same and when the content of its source and of every header
+    it included (read from the dependency file written by the compiler) did not change since the last build.
+    """
+
+    def __init__(self, directory: pathlib.Path):
+        """Load the manifest of a build folder.
+
+        :param directory: is the build *directory* where the objects and the manifest are stored
+        """
+        self.__manifest = directory / MANIFEST_NAME
+        self.__hashes = {}
+        self.__lock = threading.Lock()
+        self.dirty = False
+
+        try:
+            self.__entries = json.loads(self.__manifest.read_text())
+        except (OSError, ValueError):
+            self.__entries = {}
+
+    def __hash(self, path: pathlib.Path) -> str:
+        key = str(path)
+        if key not in self.__hashes:
+            try:
+                self.__hashes[key] = hashlib.sha1(path.read_bytes()).hexdigest()
+            except OSError:
+                self.__hashes[key] = None
+        return self.__hashes[key]
+
+    @staticmethod
+    def __read_depfile(depfile: pathlib.Path) -> list:
+        """Parse a make rule written by the compiler (-MMD) and return the prerequisites."""
+        try:
+            rule = depfile.read_text().replace('\\\n', ' ')
+        except OSError:
+            return []
+
+        _, _, prerequisites = rule.partition(': ')
+        return [pathlib.Path(d.replace('\\ ', ' ')) for d in re.split(r'(?<!\\)\s+', prerequisites) if d]
+
+    def is_fresh(self, target: pathlib.Path, flags: list) -> bool:
+        """Check if an object is still valid.
+
+        :param target: is the object *file*
+        :param flags: is the compile command, without the output
+        :return: True if the object can be reused
+        """
+        entry = self.__entries.get(str(target))
+        if entry is None or entry['flags'] != flags or not target.exists():
+            return False
+
+        return all(self.__hash(pathlib.Path(dep)) == h for dep, h in entry['deps'].items())
+
+    def update(self, target: pathlib.Path, source: pathlib.Path, depfile: pathlib.Path, flags: list):
+        """Record a freshly compiled object.
+
+        :param target: is the object *file*
+        :param source: is the compiled *file*
+        :param depfile: is the dependency *file* written by the compiler
+        :param flags: is the compile command, without the output
+        """
+        deps = [source] + [d for d in ObjectCache.__read_depfile(depfile) if d != source]
+
+        with self.__lock:
+            for dep in deps:
+                self.__hashes.pop(str(dep), None)
+
+            self.__entries[str(target)] = {'flags': flags, 'deps': {str(d): self.__hash(d) for d in deps}}
+            self.dirty = True
+
+    def clear(self):
+        """Forget every object, so they will all be compiled again."""
+        self.__entries = {}
+        self.dirty = True
+
+    def save(self):
+        """Write the manifest next to the objects."""
+        self.__manifest.parent.mkdir(parents=True, exist_ok=True)
+        self.__manifest.write_text(json.dumps(self.__entries, indent=1))
+
+
 def compile_source(source: pathlib.Path, target_dir: pathlib.Path = None, include_dirs: list = None,
                    avr_path: pathlib.Path = None, arch: str = ARCH, clock: str = CPU_CLOCK, verbose: bool = False,
-                   simulate: bool = False) -> pathlib.Path:
+                   simulate: bool = False, cache: ObjectCache = None, out: io.TextIOBase = None) -> pathlib.Path:
     """Compile a single source file, using compiler selected based on file extension and translating arguments
     to valid compiler flags.
 
@@ -110,6 +231,8 @@ def compile_source(source: pathlib.Path, target_dir: pathlib.Path = None, includ
     :param clock: target clock speed
     :param verbose: toggle print
     :param simulate: actually send commands
+    :param cache: reuse the object if its source and headers did not change (None to always compile)
+    :param out: where the messages are written (None for the console)
 
     :return: Path of the object
     """
@@ -121,21 +244,22 @@ def compile_source(source: pathlib.Path, target_dir: pathlib.Path = None, includ
     ext = source.suffix
     compiler = COMPILERS.get(ext, None)
     if compiler is None:
-        _print_separator()
-        print(source, 'has no known compiler')
-        _print_separator()
+        _print_separator(file=out)
+        print(source, 'has no known compiler', file=out)
+        _print_separator(file=out)
         return NULL_PATH
     if compiler == 'header':
-        print(source, 'is a header')
+        print(source, 'is a header', file=out)
         return NULL_PATH
     if compiler == 'arduino':
-        print(source, 'is an Arduino file (hopefully transformed)')
+        print(source, 'is an Arduino file (hopefully transformed)', file=out)
         return NULL_PATH
 
     if target_dir is None:
         target_dir = source.parent
     # Add '.o' to the extension, then retrieve the name, and put it on the target path
     target = target_dir / (source.name + '.o')
+    depfile = target_dir / (source.name + '.d')
 
     # create include list, don't use set() because order matters
     dirs = [source.parent]
@@ -145,23 +269,35 @@ def compile_source(source: pathlib.Path, target_dir: pathlib.Path = None, includ
 
     includes = [f'-I{d}' for d in dirs]
 
-    cmd = [compiler if avr_path is None else str(avr_path / compiler),
+    flags = [compiler if avr_path is None else str(avr_path / compiler),
+             '-c', '-g', '-Os', '-w', '-ffunction-sections', '-fdata-sections',
+             f'-mmcu={arch}',
+             f'-DF_CPU={clock}L',
+             f'-DARDUINO={ENV_VERSION}',
+             *includes,
+             str(source)]
+
+    if cache is not None and cache.is_fresh(target, flags):
+        if verbose:
+            print(source, 'is up to date', file=out)
+        return target
+
+    cmd = [flags[0],
            *(['-v'] if verbose else []),
-           '-c', '-g', '-Os', '-w', '-ffunction-sections', '-fdata-sections',
-           f'-mmcu={arch}',
-           f'-DF_CPU={clock}L',
-           f'-DARDUINO={ENV_VERSION}',
-           *includes,
+           *flags[1:-1],
+           '-MMD', f'-MF{depfile}',
            f'-o{target}',
-           str(source)]
+           flags[-1]]
 
-    _exec(cmd, simulate=simulate, debug=verbose)
+    _exec(cmd, simulate=simulate, debug=verbose, out=out)
+    if cache is not None and not simulate:
+        cache.update(target, source, depfile, flags)
     return target
 
 
 def compile_directory(directory: pathlib.Path, target_dir: pathlib.Path = None, include_dirs: list = None,
                       avr_path: pathlib.Path = None, arch: str = ARCH, clock: str = CPU_CLOCK, verbose: bool = False,
-                      simulate: bool = False) -> list:
+                      simulate: bool = False, cache: ObjectCache = None, jobs: int = 1) -> list:
     """Compile all source files in a given directory
 
     :param directory: is the *directory* that will be crawled and compiled (see compile_source)
@@ -172,29 +308,44 @@ def compile_directory(directory: pathlib.Path, target_dir: pathlib.Path = None,
     :param clock: target clock speed
     :param verbose: toggle print
     :param simulate: actually send commands
+    :param cache: reuse the objects whose source and headers did not change (None to always compile)
+    :param jobs: number of files compiled at the same time (messages are printed file by file)
 
-    :return: list of all .obj *files* Path created
+    :return: list of all .obj *files* Path created, sorted by source name
     """
 
     if include_dirs is None:
         include_dirs = []
 
-    obj_files = []
-    for filename in directory.iterdir():
-        if filename.is_file():
+    sources = sorted(filename for filename in directory.iterdir() if filename.is_file())
+
+    def job(filename: pathlib.Path) -> tuple:
+        out = io.StringIO()
+        try:
             obj = compile_source(filename, include_dirs=include_dirs, avr_path=avr_path, target_dir=target_dir,
-                                 arch=arch, clock=clock, verbose=verbose, simulate=simulate)
+                                 arch=arch, clock=clock, verbose=verbose, simulate=simulate, cache=cache, out=out)
+        except Exception as e:
+            return None, e, out.getvalue()
+        return obj, None, out.getvalue()
+
+    obj_files = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        # Results are read in submission order, whatever the order in which the jobs finish
+        for obj, error, messages in executor.map(job, sources):
+            print(messages, end='')
+            if error is not None:
+                raise error
             if obj is not NULL_PATH:
                 obj_files.append(obj)
 
     return obj_files
 
 
-def append_to_archive(obj_file: pathlib.Path, archive: pathlib.Path, avr_path: pathlib.Path = None,
+def append_to_archive(obj_files: list, archive: pathlib.Path, avr_path: pathlib.Path = None,
                       verbose: bool = False, simulate: bool = False):
     """Create an .a archive out of .obj files
 
-    :param obj_file: is the *file* that will be archived
+    :param obj_files: is a list of Path of the *files* that will be archived, in this order
     :param archive: is the output *file* where the archive will be
     :param avr_path: is the path to the avr tools (None if already in path)
     :param verbose: toggle print
@@ -204,7 +355,7 @@ def append_to_archive(obj_file: pathlib.Path, archive: pathlib.Path, avr_path: p
     cmd = ['avr-ar' if avr_path is None else str(avr_path / 'avr-ar'),
            'rcs' + ('v' if verbose else ''),
            str(archive),
-           str(obj_file)]
+           *[str(p) for p in obj_files]]
 
     _exec(cmd, simulate=simulate, debug=verbose)
 
@@ -307,6 +458,8 @@ def main(argv):
                         help='project directory')
     parser.add_argument('-v', '--verbose', dest='verbose', default=False, action='store_true',
                         help='be verbose')
+    parser.add_argument('-j', '--jobs', dest='jobs', default=1, metavar='N', type=int,
+                        help='compile N files at the same time, 0 for one per CPU [1]')
     parser.add_argument('-r', '--refresh', dest='refresh', default=False, action='store_true',
                         help="delete build folder")
     parser.add_argument('--only-build', dest='only_build', default=False, action='store_true',
@@ -331,6 +484,9 @@ def main(argv):
     parser.add_argument('--dude-conf', dest='dude_conf', default=None, metavar='FILE',
                         help='avrdude conf file (.../Arduino/hardware/tools/avr/etc/avrdude.conf), '
                              'if not specified - will assume found in default location')
+    parser.add_argument('--cache-dir', dest='cache_dir', default=str(CACHE_DIR), metavar='DIRECTORY',
+                        help=f'DIRECTORY where the core archives and built hex are shared between projects '
+                             f'[{CACHE_DIR}]')
     parser.add_argument('--simulate', dest='simulate', default=False, action='store_true',
                         help='only simulate commands')
     parser.add_argument(f'--core', dest='core', default=CORE,
@@ -367,65 +523,106 @@ def main(argv):
     include_dirs = [check_dir(l, EXITCODE_INVALID_INCLUDE, '''Include does not exist [$path]''') for l in
                     args.include_dirs]
 
-    # ########### #
-    # ## Build ## #
-    # ########### #
+    jobs = args.jobs or os.cpu_count() or 1
+
+    # ############### #
+    # ## Hex store ## #
+    # ############### #
 
-    # create build directory to store the compilation output files
+    # a sketch built from the same sources, for the same board and clock, is flashed without being built again
     main_path = pathlib.Path(args.directory).resolve()
-    build_path = main_path / BUILD_DIR_NAME
-    print(f'Building in {build_path}...')
-    if build_path.exists() and args.refresh:
-        print(f'Deleting then creating build folder')
-        shutil.rmtree(build_path)
-        build_path.mkdir()
-    elif not build_path.exists():
-        build_path.mkdir()
-
-    # compile arduino core files
-    _print_separator(sep='!', title="Compiling Arduino")
-    core_obj_files = compile_directory(core_path, build_path, include_dirs=arduino_files, avr_path=avr_path,
-                                       arch=args.arch, clock=args.cpu_clock, verbose=args.verbose,
-                                       simulate=args.simulate)
-
-    # compile directories passed to program
-    _print_separator(sep='!', title="Compiling side files")
-    libraries_obj_files = []
-    for library in libraries:
-        lib = compile_directory(library, build_path, include_dirs=libraries + arduino_files, avr_path=avr_path,
-                                arch=args.arch, clock=args.cpu_clock, verbose=args.verbose, simulate=args.simulate)
-        libraries_obj_files.extend(lib)
-
-    # change .ino to .cpp (and save paths to delete them afterward)
-    _print_separator(sep='!', title="Detecting ino")
-    cpp_files = []
-    for ino_file in main_path.glob('*.ino'):
-        cpp_file = ino_file.with_suffix('.cpp')
-
-        _print_separator(sep='', title=f"Transforming {ino_file} to {cpp_file} ...\n")
-        shutil.copy(src=str(ino_file), dst=str(cpp_file))
-
-        cpp_files.append(cpp_file)
-
-    # compile project
-    _print_separator(sep='!', title="Compiling Sketch")
-    project_obj_files = compile_directory(main_path, build_path,
-                                          include_dirs=(include_dirs + libraries + arduino_files), avr_path=avr_path,
-                                          arch=args.arch, clock=args.cpu_clock, verbose=args.verbose,
-                                          simulate=args.simulate)
-
-    # link project, libraries and core .obj files to a single .elf
-    _print_separator(sep='!', title="Linking")
-    link_output = build_path / (main_path.name + '.elf')
-    link(link_output, project_obj_files + libraries_obj_files + core_obj_files, avr_path=avr_path, arch=args.arch,
-         verbose=args.verbose, simulate=args.simulate)
-
-    hex_section, eeprom_section = make_hex(link_output, avr_path=avr_path, verbose=args.verbose, simulate=args.simulate)
-
-    # Delete previously created files
-    for cpp_file in cpp_files:
-        _print_separator(sep='', title=f"Deleting {cpp_file} ...\n")
-        cpp_file.unlink()
+    hex_store = pathlib.Path(args.cache_dir).resolve() / HEX_STORE_NAME
+    key = tree_hash([main_path] + include_dirs + libraries + arduino_files,
+                    board, args.arch, args.cpu_clock, ENV_VERSION)
+    stored_hex = hex_store / f'{main_path.name}_{board}_{args.cpu_clock}_{key}.hex'
+
+    if stored_hex.exists() and not args.refresh:
+        _print_separator(sep='!', title="Using stored hex")
+        print(f'{stored_hex} is up to date, skipping compile and link')
+        hex_section = stored_hex
+    else:
+        # ########### #
+        # ## Build ## #
+        # ########### #
+
+        # create build directory to store the compilation output files
+        build_path = main_path / BUILD_DIR_NAME
+        print(f'Building in {build_path}...')
+        if build_path.exists() and args.refresh:
+            print(f'Deleting then creating build folder')
+            shutil.rmtree(build_path)
+            build_path.mkdir()
+        elif not build_path.exists():
+            build_path.mkdir()
+
+        # objects of the project are reused until their sources change, the core is shared by board and clock
+        cache = ObjectCache(build_path)
+        core_build_path = pathlib.Path(args.cache_dir).resolve() / f'{board}_{args.arch}_{args.cpu_clock}'
+        core_build_path.mkdir(parents=True, exist_ok=True)
+        core_cache = ObjectCache(core_build_path)
+        if args.refresh:
+            core_cache.clear()
+
+        # compile arduino core files, and archive them
+        _print_separator(sep='!', title="Compiling Arduino")
+        core_obj_files = compile_directory(core_path, core_build_path, include_dirs=arduino_files, avr_path=avr_path,
+                                           arch=args.arch, clock=args.cpu_clock, verbose=args.verbose,
+                                           simulate=args.simulate, cache=core_cache, jobs=jobs)
+
+        core_archive = core_build_path / CORE_ARCHIVE_NAME
+        if core_cache.dirty or not core_archive.exists():
+            _print_separator(sep='!', title="Archiving Arduino")
+            if core_archive.exists():
+                core_archive.unlink()
+            append_to_archive(core_obj_files, core_archive, avr_path=avr_path, verbose=args.verbose,
+                              simulate=args.simulate)
+        core_cache.save()
+
+        # compile directories passed to program
+        _print_separator(sep='!', title="Compiling side files")
+        libraries_obj_files = []
+        for library in libraries:
+            lib = compile_directory(library, build_path, include_dirs=libraries + arduino_files, avr_path=avr_path,
+                                    arch=args.arch, clock=args.cpu_clock, verbose=args.verbose, simulate=args.simulate,
+                                    cache=cache, jobs=jobs)
+            libraries_obj_files.extend(lib)
+
+        # change .ino to .cpp (and save paths to delete them afterward)
+        _print_separator(sep='!', title="Detecting ino")
+        cpp_files = []
+        for ino_file in main_path.glob('*.ino'):
+            cpp_file = ino_file.with_suffix('.cpp')
+
+            _print_separator(sep='', title=f"Transforming {ino_file} to {cpp_file} ...\n")
+            shutil.copy(src=str(ino_file), dst=str(cpp_file))
+
+            cpp_files.append(cpp_file)
+
+        # compile project
+        _print_separator(sep='!', title="Compiling Sketch")
+        project_obj_files = compile_directory(main_path, build_path,
+                                              include_dirs=(include_dirs + libraries + arduino_files),
+                                              avr_path=avr_path, arch=args.arch, clock=args.cpu_clock,
+                                              verbose=args.verbose, simulate=args.simulate, cache=cache, jobs=jobs)
+        cache.save()
+
+        # link project, libraries .obj files and the core archive to a single .elf
+        _print_separator(sep='!', title="Linking")
+        link_output = build_path / (main_path.name + '.elf')
+        link(link_output, project_obj_files + libraries_obj_files + [core_archive], avr_path=avr_path, arch=args.arch,
+             verbose=args.verbose, simulate=args.simulate)
+
+        hex_section, eeprom_section = make_hex(link_output, avr_path=avr_path, verbose=args.verbose,
+                                               simulate=args.simulate)
+
+        # Delete previously created files
+        for cpp_file in cpp_files:
+            _print_separator(sep='', title=f"Deleting {cpp_file} ...\n")
+            cpp_file.unlink()
+
+        if not args.simulate:
+            hex_store.mkdir(parents=True, exist_ok=True)
+            shutil.copy(src=str(hex_section), dst=str(stored_hex))
 
     # ############ #
     # ## Upload ## #
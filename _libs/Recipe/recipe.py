@@ -0,0 +1,382 @@
+"""Run a test described by a declarative plan (JSON, or YAML if PyYAML is installed).
+
+A plan declares the instruments, the diodes, some constants and a list of phases::
+
+    {
+      "instruments": {"ds": {"driver": "VISA.DS4024.DS4024"},
+                      "surge": {"resource": "ASRL13::INSTR"}},
+      "constants": {"SHUNT": 0.004998},
+      "diodes": [["B1", "KE12DJ08L_D10"], ["A1", "KE12DJ08_D2"]],
+      "phases": [
+        {"name": "setup", "steps": [
+          {"instrument": "ds", "configure": {"time_scale": 1e-3, "set_chn_ratio": ["@Channels.CHANNEL1", "@Ratios.X1"]}}
+        ]},
+        {"name": "surge", "for_each": "diodes", "steps": [
+          {"instrument": "ds", "set": {"running": true, "sweep": "@Sweeps.SINGLE"}},
+          {"instrument": "surge", "call": "write_raw", "args": ["s"]},
+          {"instrument": "ds", "wait": "stopped", "timeout": 5, "timeout_as": "is_dead"},
+          {"instrument": "ds", "call": "get_curve", "args": ["@Channels.CHANNEL1"], "store_as": "volt"},
+          {"call": "save_cld.save_cld", "args": ["=volt[0]", "=volt[1]", "=volt[1]", "${name}"], "needs": ["volt"]}
+        ], "until": "is_dead"}
+      ]
+    }
+
+Steps:
+ * ``configure``: attributes (or ``set_*``-like methods, the last argument being the value) that are only written
+   when they differ from the last value written by the recipe. Redundant reconfigurations are skipped.
+ * ``set``: attributes that are always written.
+ * ``call``: a method of the instrument, or a ``module.function`` when there is no instrument.
+ * ``wait``: poll an attribute of the instrument until it ``equals`` a value (True by default).
+ * ``sleep``: a delay, on one instrument only when ``instrument`` is given.
+ * ``phase``: a nested phase.
+
+Values are resolved when the step runs: ``${var}`` is substituted from the context (``${var}`` alone gives the raw
+object), ``@Enum.MEMBER`` is looked up on the driver class and ``=expression`` is evaluated with the context.
+The context holds the constants, the loop variables (``name``/``board`` for ``for_each``, ``repetition`` for
+``repeat``, the ``range`` variable) and the results stored with ``store_as``.
+
+A looping phase stops early when its ``until`` is true after an iteration: ``until`` is the name of a variable of
+the context (ex. ``"is_dead"``), or a value resolved as above (ex. ``"=is_dead or repetition > 3"``).
+
+Each phase is compiled into a graph: a step waits for the previous step on the same instrument, for the previous
+step without instrument (a barrier), for the last step of the instruments listed in ``after`` and for the steps of
+the phase that store the variables listed in ``needs`` (``store_as`` or ``timeout_as``). Independent steps on
+different instruments run at the same time. Each phase runs on its own workers, so a nested phase never waits for
+the workers of the phase that runs it. The steps without instrument (``call`` of a module function, ``sleep``,
+``phase``) run in the thread that runs the recipe, which is the main thread with ``main()``: matplotlib (ex.
+plot_cld) does not work from a worker thread. The time spent in each phase is reported at the end.
+"""
+import argparse
+import importlib
+import json
+import math
+import pathlib
+import re
+import sys
+import time as tme
+from collections import namedtuple, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from string import Template
+from typing import List, Dict
+
+STEP_KINDS = ['configure', 'set', 'call', 'wait', 'sleep', 'phase']
+EVAL_BUILTINS = {'abs': abs, 'min': min, 'max': max, 'len': len, 'round': round, 'int': int, 'float': float,
+                 'str': str, 'range': range, 'list': list, 'zip': zip, 'sum': sum, 'math': math,
+                 'Path': pathlib.Path}
+
+
+class Recipe:
+    Step = namedtuple('Step', ['index', 'kind', 'instrument', 'spec', 'deps'])
+    Step.__doc__ = """A compiled step of a phase."""
+    Step.index.__doc__ += """ : Position of the step in its phase (int)"""
+    Step.kind.__doc__ += """ : One of STEP_KINDS (str)"""
+    Step.instrument.__doc__ += """ : Name of the instrument, None for a barrier (str)"""
+    Step.spec.__doc__ += """ : The step, as written in the plan (dict)"""
+    Step.deps.__doc__ += """ : Indexes of the steps that must be done before (frozenset)"""
+
+    def __init__(self, plan: dict, *, verbose: bool = False):
+        """Initialize a recipe from a plan. The instruments are connected by connect().
+
+        :param plan: the plan, as loaded from the file
+        :param verbose: print each step when it runs
+        """
+        self.plan = plan
+        self.verbose = verbose
+
+        self.instruments = {}
+        self.context = dict(plan.get('constants', {}))
+        self.timings = defaultdict(float)
+        self.skipped = 0
+
+        self.__state = {}
+        self.__compiled = {}
+
+    @staticmethod
+    def load(path: pathlib.Path, **kwargs) -> 'Recipe':
+        """Load a plan file (.json, or .yml/.yaml if PyYAML is installed).
+
+        :param path: path to the plan
+        :return: the recipe
+        """
+        path = pathlib.Path(path)
+        with open(str(path), 'r') as plan_file:
+            if path.suffix in ['.yml', '.yaml']:
+                import yaml
+                plan = yaml.safe_load(plan_file)
+            else:
+                plan = json.load(plan_file)
+
+        return Recipe(plan, **kwargs)
+
+    def connect(self, vc=None):
+        """Create the drivers of all the declared instruments.
+
+        An instrument is either ``{"driver": "module.Class", "index": 0}``, found by the NAME of the class,
+        or ``{"resource": "ASRL13::INSTR"}``, opened without any check.
+
+        :param vc: the VisaController (None to create one)
+        """
+        from VISA.VISA_controller import VisaController
+
+        vc = vc or VisaController(query=self.plan.get('query', '?*::INSTR'))
+        for name, decl in self.plan.get('instruments', {}).items():
+            if 'resource' in decl:
+                self.instruments[name] = vc.get_unchecked_resource(decl['resource'])
+            else:
+                module, _, cls = decl['driver'].rpartition('.')
+                driver = getattr(importlib.import_module(module), cls)
+                self.instruments[name] = driver(vc.get_instruments_by_name(driver.NAME)[decl.get('index', 0)])
+
+    def compile(self, steps: List[dict]) -> List[Step]:
+        """Compile a list of steps into a graph.
+
+        :param steps: the steps, as written in the plan
+        :return: the steps with their dependencies
+        """
+        compiled = []
+        last_on = {}
+        last_barrier = None
+        since_barrier = []
+        producers = {}
+
+        for index, spec in enumerate(steps):
+            kinds = [k for k in STEP_KINDS if k in spec]
+            if len(kinds) != 1:
+                raise ValueError(f"Step {index} must have one of {STEP_KINDS} : {spec}")
+            kind = kinds[0]
+            instrument = spec.get('instrument')
+
+            deps = set()
+            if instrument is None:
+                # A barrier waits for everything since the previous barrier
+                deps.update(since_barrier)
+                since_barrier = []
+            else:
+                if instrument in last_on:
+                    deps.add(last_on[instrument])
+                since_barrier.append(index)
+            if last_barrier is not None:
+                deps.add(last_barrier)
+            # Explicit ordering between instruments (ex. pulse only once the scope is armed)
+            deps.update(last_on[other] for other in spec.get('after', []) if other in last_on)
+            if instrument is None:
+                last_barrier = index
+            else:
+                last_on[instrument] = index
+
+            # Data dependencies, on the steps of this phase storing a variable used here (others are already set)
+            deps.update(producers[var] for var in spec.get('needs', []) if var in producers)
+            for key in ['store_as', 'timeout_as']:
+                if key in spec:
+                    producers[spec[key]] = index
+
+            compiled.append(Recipe.Step(index, kind, instrument, spec, frozenset(deps)))
+
+        return compiled
+
+    def run(self) -> Dict[str, float]:
+        """Run all the phases of the plan.
+
+        :return: the time spent in each phase (seconds)
+        """
+        self.timings.clear()
+        self.skipped = 0
+        for phase in self.plan.get('phases', []):
+            self.run_phase(phase, self.context)
+
+        return dict(self.timings)
+
+    def run_phase(self, phase: dict, context: dict):
+        """Run a phase, once or for each value of its loop.
+
+        :param phase: the phase, as written in the plan
+        :param context: the variables
+        """
+        name = phase.get('name', 'phase')
+        key = id(phase)
+        if key not in self.__compiled:
+            self.__compiled[key] = self.compile(phase.get('steps', []))
+        steps = self.__compiled[key]
+
+        start = tme.time()
+        with ThreadPoolExecutor(max_workers=len(self.instruments) + 1) as pool:
+            for variables in self.__iterations(phase, context):
+                context.update(variables)
+                self.__run_graph(steps, context, pool)
+                if 'until' in phase and self.__until(phase['until'], context):
+                    break
+        self.timings[name] += tme.time() - start
+
+    def report(self) -> str:
+        """Format the time spent in each phase."""
+        lines = [f"{'Phase':<30}{'Time (s)':>12}"]
+        lines += [f"{name:<30}{duration:>12.2f}" for name, duration in self.timings.items()]
+        lines += [f"{'Skipped reconfigurations':<30}{self.skipped:>12d}"]
+        return '\n'.join(lines)
+
+    # ############# #
+    # ## Private ## #
+    # ############# #
+
+    def __iterations(self, phase: dict, context: dict):
+        if 'for_each' in phase:
+            for diode in self.__resolve(self.plan.get(phase['for_each'], []), context):
+                yield {'board': diode[0], 'name': diode[1]}
+        elif 'repeat' in phase:
+            for repetition in range(int(self.__resolve(phase['repeat'], context))):
+                yield {'repetition': repetition}
+        elif 'range' in phase:
+            rng = phase['range']
+            start, stop, step = [self.__resolve(rng.get(k, d), context) for k, d in
+                                 [('start', 0), ('stop', 0), ('step', 1)]]
+            value = start
+            while (step > 0 and value <= stop) or (step < 0 and value >= stop):
+                yield {rng['var']: value}
+                value += step
+        else:
+            yield {}
+
+    def __run_graph(self, steps: List[Step], context: dict, pool: ThreadPoolExecutor):
+        done = set()
+        pending = list(steps)
+        running = {}
+
+        while pending or running:
+            for step in [s for s in pending if s.deps <= done]:
+                pending.remove(step)
+                if step.instrument is None:
+                    # A barrier always runs alone, so it costs nothing to run it in the thread of the recipe
+                    self.__run_step(step, context)
+                    done.add(step.index)
+                else:
+                    running[pool.submit(self.__run_step, step, context)] = step
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step = running.pop(future)
+                future.result()  # Raise the step exception, if any
+                done.add(step.index)
+
+    def __run_step(self, step: Step, context: dict):
+        spec = step.spec
+        instr = self.instruments.get(step.instrument)
+        if self.verbose:
+            print(f"{step.instrument or '-':>10} {step.kind:<10}{spec[step.kind]}")
+
+        if step.kind == 'configure':
+            for name, value in spec['configure'].items():
+                args = self.__resolve(value, context, instr)
+                args = args if isinstance(args, list) and callable(getattr(instr, name)) else [args]
+                state_key = (step.instrument, name, repr(args[:-1]))
+                if self.__state.get(state_key) == repr(args[-1]):
+                    self.skipped += 1
+                    continue
+                self.__apply(instr, name, args)
+                self.__state[state_key] = repr(args[-1])
+
+        elif step.kind == 'set':
+            for name, value in spec['set'].items():
+                self.__apply(instr, name, [self.__resolve(value, context, instr)])
+
+        elif step.kind == 'call':
+            args = self.__resolve(spec.get('args', []), context, instr)
+            kwargs = self.__resolve(spec.get('kwargs', {}), context, instr)
+            if instr is None:
+                module, _, function = spec['call'].rpartition('.')
+                result = getattr(importlib.import_module(module), function)(*args, **kwargs)
+            else:
+                result = getattr(instr, spec['call'])(*args, **kwargs)
+            if 'store_as' in spec:
+                context[spec['store_as']] = result
+
+        elif step.kind == 'wait':
+            expected = self.__resolve(spec.get('equals', True), context, instr)
+            timeout = spec.get('timeout')
+            if 'timeout_as' in spec:
+                context[spec['timeout_as']] = False
+
+            ts = tme.time()
+            while getattr(instr, spec['wait']) != expected:
+                if timeout is not None and (ts + timeout) < tme.time():
+                    if 'timeout_as' not in spec:
+                        raise TimeoutError(f"{step.instrument}.{spec['wait']} != {expected} after {timeout}s")
+                    context[spec['timeout_as']] = True
+                    break
+                tme.sleep(spec.get('period', 0))
+
+        elif step.kind == 'sleep':
+            tme.sleep(self.__resolve(spec['sleep'], context))
+
+        elif step.kind == 'phase':
+            self.run_phase(spec['phase'], context)
+
+    def __apply(self, instr, name: str, args: list):
+        attr = getattr(type(instr), name, None)
+        if isinstance(attr, property) or attr is None:
+            setattr(instr, name, args[-1])
+        else:
+            getattr(instr, name)(*args)
+        # A plain set of a configured value keeps the known state right
+        for key in [k for k in self.__state if k[0] is not None and k[1] == name]:
+            if key[2] == repr(args[:-1]):
+                self.__state[key] = repr(args[-1])
+
+    def __until(self, until, context: dict) -> bool:
+        if isinstance(until, str) and until.isidentifier():
+            if until not in context:
+                raise KeyError(f"Unknown variable in until : {until}")
+            return bool(context[until])
+        return bool(self.__resolve(until, context))
+
+    def __resolve(self, value, context: dict, instr=None):
+        if isinstance(value, list):
+            return [self.__resolve(v, context, instr) for v in value]
+        if isinstance(value, dict):
+            return {k: self.__resolve(v, context, instr) for k, v in value.items()}
+        if not isinstance(value, str):
+            return value
+
+        match = re.fullmatch(r'\$\{(\w+)\}', value)
+        if match:
+            return context[match.group(1)]
+        value = Template(value).safe_substitute(context)
+
+        if value.startswith('='):
+            return eval(value[1:], {'__builtins__': EVAL_BUILTINS}, dict(context))
+        if value.startswith('@'):
+            obj = type(instr)
+            for attr in value[1:].split('.'):
+                obj = getattr(obj, attr)
+            return obj
+        return value
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('plan', help='plan file (.json, .yml or .yaml)')
+    parser.add_argument('-v', '--verbose', dest='verbose', default=False, action='store_true',
+                        help='print each step')
+    parser.add_argument('-q', '--query', dest='query', default=None,
+                        help='VISA query used to list the instruments (overrides the plan)')
+
+    args = parser.parse_args(argv)
+
+    recipe = Recipe.load(pathlib.Path(args.plan), verbose=args.verbose)
+    if args.query is not None:
+        recipe.plan['query'] = args.query
+    recipe.connect()
+
+    try:
+        recipe.run()
+    finally:
+        print(recipe.report())
+
+
+if __name__ == "__main__":
+    # Recipes are run from the project directory, which holds its own drivers and helpers
+    sys.path.append(str(pathlib.Path('.').resolve()))
+    sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+    main(sys.argv[1:])
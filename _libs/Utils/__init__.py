@@ -1,2 +1,5 @@
 from .mail import simple_mail_sender
 from .logger import Logger
+from .checkpoint import Checkpoint
+from .pyramid import MinMaxPyramid
+from .catalog import Catalog
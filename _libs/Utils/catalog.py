@@ -0,0 +1,152 @@
+from collections import namedtuple
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List
+import sqlite3
+import time as tme
+
+
+class Catalog:
+    """SQLite index of the saved records, to find captures without walking the folders.
+
+    Each record is a file (or a part of a file, at a byte offset, for files that are appended to) with the values
+    of its test. The savers (diode_save, save_cld, the HTRB writer) fill it, then an analysis selects what it needs:
+
+    >>>catalog = Catalog.open(Path("./csv/catalog.sqlite"))
+    ...for record in catalog.select("amp > ?", [50], diode="KE12DJ08L_D1", test="surge", temp=25):
+    ...    print(record.path)
+    """
+
+    NAME = "catalog.sqlite"
+    COLUMNS = ['path', 'diode', 'test', 'amp', 'temp', 'repetition', 'pulse_width', 'burned', 'timestamp', 'offset',
+               'rows']
+
+    Record = namedtuple('Record', COLUMNS)
+    Record.__doc__ = """A saved record"""
+    Record.path.__doc__ += """ : File of the record (Path)"""
+    Record.diode.__doc__ += """ : Name of the diode"""
+    Record.test.__doc__ += """ : Type of test (ex. surge, direct, reverse, cld, htrb)"""
+    Record.amp.__doc__ += """ : Surge current (A, None if not relevant)"""
+    Record.temp.__doc__ += """ : Temperature (Celsius)"""
+    Record.repetition.__doc__ += """ : Repetition of the test"""
+    Record.pulse_width.__doc__ += """ : Pulse width (s)"""
+    Record.burned.__doc__ += """ : True if the diode was burned by this test"""
+    Record.timestamp.__doc__ += """ : Time of the save (s, epoch)"""
+    Record.offset.__doc__ += """ : Position of the record in the file (bytes)"""
+    Record.rows.__doc__ += """ : Number of rows of the record"""
+
+    __catalogs: Dict[Path, 'Catalog'] = {}
+    __catalogs_lock = Lock()
+
+    def __init__(self, path: Path):
+        """Open (or create) a catalog. Use Catalog.open to share it between the savers.
+
+        :param path: path to the SQLite file (folders are created)
+        """
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.__lock = Lock()
+        self.__connection = sqlite3.connect(str(self.path), check_same_thread=False)  # Shared with the saver threads
+        with self.__lock, self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")  # An analysis can read during a campaign
+            self.__connection.execute("""CREATE TABLE IF NOT EXISTS records (
+                                         path TEXT NOT NULL, diode TEXT, test TEXT, amp REAL, temp REAL,
+                                         repetition INTEGER, pulse_width REAL, burned INTEGER, timestamp REAL,
+                                         offset INTEGER NOT NULL DEFAULT 0, rows INTEGER,
+                                         UNIQUE(path, offset))""")
+            self.__connection.execute("CREATE INDEX IF NOT EXISTS records_diode ON records (diode, test, temp, amp)")
+
+    @staticmethod
+    def open(path: Path) -> 'Catalog':
+        """Get the catalog of a file, opened only once per process.
+
+        :param path: path to the SQLite file, or to a folder (the catalog is then NAME in this folder)
+        :return: the catalog
+        """
+        path = Path(path)
+        if path.is_dir() or not path.suffix:
+            path = path / Catalog.NAME
+        path = path.resolve()
+
+        with Catalog.__catalogs_lock:
+            if path not in Catalog.__catalogs:
+                Catalog.__catalogs[path] = Catalog(path)
+            return Catalog.__catalogs[path]
+
+    def add(self, path: Path, *, diode: str, test: str, amp: float = None, temp: float = None,
+            repetition: int = None, pulse_width: float = None, burned: bool = False, timestamp: float = None,
+            offset: int = 0, rows: int = None):
+        """Add a record, or replace it if this file (at this offset) is already in the catalog.
+
+        :param path: file of the record, stored relative to the catalog when it is in its folder
+        :param diode: name of the diode
+        :param test: type of test (ex. surge)
+        :param amp: surge current (A)
+        :param temp: temperature (Celsius)
+        :param repetition: repetition of the test
+        :param pulse_width: pulse width (s)
+        :param burned: True if the diode was burned by this test
+        :param timestamp: time of the save (s, epoch, None for now)
+        :param offset: position of the record in the file (bytes)
+        :param rows: number of rows of the record
+        """
+        path = Path(path).resolve()
+        try:
+            path = path.relative_to(self.path.parent)
+        except ValueError:
+            pass
+
+        values = (path.as_posix(), diode, test, amp, temp, repetition, pulse_width, int(burned),
+                  tme.time() if timestamp is None else timestamp, offset, rows)
+        with self.__lock, self.__connection:
+            self.__connection.execute(f"INSERT OR REPLACE INTO records ({', '.join(Catalog.COLUMNS)}) "
+                                      f"VALUES ({', '.join('?' * len(values))})", values)
+
+    def select(self, where: str = None, params: List = (), **equals) -> List[Record]:
+        """Find records.
+
+        :param where: SQL condition on the columns (ex. "amp > ? AND burned"), None for none
+        :param params: values of the ? of where
+        :param equals: columns that must be equal to a value (ex. diode="KE12DJ08L_D1", test="surge")
+        :return: the records, in the order they were saved
+        """
+        unknown = set(equals) - set(Catalog.COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns : {', '.join(unknown)}")
+
+        conditions = [f"{column} = ?" for column in equals]
+        if where:
+            conditions.append(f"({where})")
+        query = f"SELECT {', '.join(Catalog.COLUMNS)} FROM records"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY timestamp"
+
+        with self.__lock:
+            rows = self.__connection.execute(query, [*equals.values(), *params]).fetchall()
+        return [Catalog.Record(self.__full_path(r[0]), *r[1:7], bool(r[7]), *r[8:]) for r in rows]
+
+    def close(self):
+        """Close the database."""
+        with self.__lock:
+            self.__connection.close()
+
+    def __full_path(self, path: str) -> Path:
+        path = Path(path)
+        return path if path.is_absolute() else self.path.parent / path
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+
+if __name__ == "__main__":
+    catalog = Catalog.open(Path("./csv"))
+
+    catalog.add(Path("./csv/D1/Surge/D1_surge_60A_25C.csv"), diode="D1", test="surge", amp=60, temp=25, rows=2000)
+    catalog.add(Path("./csv/D1/Surge/D1_surge_40A_25C.csv"), diode="D1", test="surge", amp=40, temp=25, rows=2000)
+
+    start = tme.time()
+    records = catalog.select("amp > ?", [50], diode="D1", test="surge", temp=25)
+    print(f"{len(records)}/{len(catalog)} records in {(tme.time() - start) * 1e3:.2f}ms")
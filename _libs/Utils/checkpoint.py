@@ -0,0 +1,71 @@
+from pathlib import Path
+import json
+import os
+import time as tme
+
+
+class Checkpoint:
+
+    def __init__(self, path: Path, period: float = 0):
+        """Initialize a checkpoint file, used to resume a campaign after a crash.
+        The state is a JSON-able dict, written atomically: the file always holds a complete state.
+
+        :param path: path to the checkpoint file (folders are created)
+        :param period: minimum time between two saves (seconds), a save sooner than that is skipped
+        """
+        self.__path = Path(path)
+        self.__period = period
+        self.__last_save = 0
+
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+
+    def save(self, state: dict, force: bool = False) -> bool:
+        """Write the state, unless the last save is more recent than period.
+
+        :param state: the campaign state (JSON-able)
+        :param force: save even if the last save is recent
+        :return: True if the state was written
+        """
+        now = tme.time()
+        if not force and (now - self.__last_save) < self.__period:
+            return False
+
+        temp = self.__path.with_suffix(self.__path.suffix + '.tmp')
+        with open(temp, 'w') as file:
+            json.dump(dict(state, saved=now), file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, self.__path)  # Atomic, a crash during the save keeps the previous state
+
+        self.__last_save = now
+        return True
+
+    def load(self) -> dict:
+        """Read the last saved state.
+
+        :return: the state, or None if there is no checkpoint (new campaign)
+        """
+        if not self.__path.is_file():
+            return None
+        with open(self.__path, 'r') as file:
+            return json.load(file)
+
+    def clear(self):
+        """Delete the checkpoint, at the end of the campaign."""
+        if self.__path.is_file():
+            self.__path.unlink()
+
+    @property
+    def exists(self) -> bool:
+        """Check if there is a state to resume."""
+        return self.__path.is_file()
+
+
+if __name__ == "__main__":
+    checkpoint = Checkpoint(Path("./checkpoint.json"), period=1)
+
+    state = checkpoint.load() or {'cycle': 0}
+    print(f"Resuming at cycle {state['cycle']}")
+    for cycle in range(state['cycle'], state['cycle'] + 5):
+        checkpoint.save({'cycle': cycle + 1})
+        tme.sleep(.5)
@@ -1,39 +1,85 @@
 from pathlib import Path
 from datetime import datetime
+from queue import Queue
+from threading import Thread
+import atexit
+import json
+import sys
+import time as tme
 
 
 class Logger:
 
-    def __init__(self, *, logger_id: str, time_format: str = "%H:%M:%S", path: Path = None, default_save: bool = False):
+    def __init__(self, *, logger_id: str, time_format: str = "%H:%M:%S", path: Path = None, default_save: bool = False,
+                 asynchronous: bool = False, structured: bool = False, max_bytes: int = None,
+                 rotate_every: float = None):
         """Initialize the Logger class.
         If path is None and default_save == False, nothing is written on disk,
         else, default path is ./ or folders are created to math defined path
 
+        In asynchronous mode, log only puts the record in a queue: formatting, printing and writing are done by a
+        background thread, so a log in an acquisition loop costs almost nothing.
+
         :param logger_id: personal id for the logger
         :param time_format: cf Datetime doc
         :param path: path to the log file
         :param default_save: default behaviour when logging (overwritten by save)
+        :param asynchronous: print and write from a background thread
+        :param structured: write JSON lines (time, id, level, message and the fields given to log) instead of text
+        :param max_bytes: start a new file when the log file is bigger than this (None for no limit)
+        :param rotate_every: start a new file after this time (seconds, None for never)
         """
         self.__id = logger_id
         self.__time_format = time_format
         self.__path = path or Path("./")
         self.__default_save = default_save
+        self.__structured = structured
+        self.__max_bytes = max_bytes
+        self.__rotate_every = rotate_every
         self.__logfile = None
+        self.__opened = 0
+        self.__queue = Queue() if asynchronous else None
 
         if default_save or path is not None:
             self.__path.mkdir(parents=True, exist_ok=True)
-            self.__logfile = open((self.__path / self.__id).with_suffix(".log"), "a+", buffering=1)  # Line buffering
+            self.__open()
+
+        if asynchronous:
+            self.__writer = Thread(target=self.__write_loop, name=f"Logger-{logger_id}", daemon=True)
+            self.__writer.start()
+            atexit.register(self.close)
 
-    def log(self, lvl: int, logs: str, save: bool = None):
+    def log(self, lvl: int, logs: str, save: bool = None, **fields):
         """Log some text to the console and optionally in a file
 
         :param lvl: tab level of the log
         :param logs: string to log (multi-lines authorized)
         :param save: save to file ?
+        :param fields: values added to the record in structured mode (ex. rep=12, current=150.)
         """
-        save = save or self.__default_save
+        record = (tme.time(), lvl, logs, save or self.__default_save, fields)
+        if self.__queue is not None:
+            self.__queue.put(record)
+        else:
+            self.__write(*record)
+
+    def flush(self):
+        """Wait until all the logs are written (asynchronous mode)."""
+        if self.__queue is not None:
+            self.__queue.join()
+
+    def close(self):
+        """Write the pending logs and close the file."""
+        if self.__queue is not None:
+            self.__queue.put(None)
+            self.__writer.join()
+            self.__queue = None
+        if self.__logfile is not None:
+            self.__logfile.close()
+            self.__logfile = None
 
-        time = datetime.now().strftime(self.__time_format)
+    def __write(self, timestamp: float, lvl: int, logs: str, save: bool, fields: dict):
+        time = datetime.fromtimestamp(timestamp).strftime(self.__time_format)
         str_lvl = '\t' * lvl
         str_id = self.__id
 
@@ -44,7 +90,44 @@ class Logger:
 
         print(log)
         if save and self.__logfile is not None:
-            self.__logfile.write(log + "\r\n")
+            if self.__structured:
+                self.__logfile.write(json.dumps(dict(time=timestamp, id=str_id, level=lvl, message=logs, **fields),
+                                                default=str) + "\n")
+            else:
+                self.__logfile.write(log + "\r\n")
+            self.__rotate()
+
+    def __write_loop(self):
+        while True:
+            record = self.__queue.get()
+            try:
+                if record is None:
+                    return
+                self.__write(*record)
+                if self.__queue.empty() and self.__logfile is not None:
+                    self.__logfile.flush()  # Nothing else to do, the file is up to date for the readers
+            except Exception as e:
+                # A record that can't be written must not stop the thread, flush and close would wait forever
+                print(f"{self.__id} : log not written ({e!r})", file=sys.stderr)
+            finally:
+                self.__queue.task_done()
+
+    def __open(self):
+        suffix = ".jsonl" if self.__structured else ".log"
+        buffering = -1 if self.__queue is not None else 1  # Line buffering, unless a thread is doing the writes
+        self.__logfile = open((self.__path / self.__id).with_suffix(suffix), "a+", buffering=buffering)
+        self.__opened = tme.time()
+
+    def __rotate(self):
+        too_big = self.__max_bytes is not None and self.__logfile.tell() >= self.__max_bytes
+        too_old = self.__rotate_every is not None and (tme.time() - self.__opened) >= self.__rotate_every
+        if not (too_big or too_old):
+            return
+
+        current = Path(self.__logfile.name)
+        self.__logfile.close()
+        current.rename(current.with_name(f"{self.__id}_{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{current.suffix}"))
+        self.__open()
 
     def __del__(self):
         if self.__logfile is not None:
@@ -61,3 +144,9 @@ if __name__ == "__main__":
         time.sleep(2)
 
     logger.log(0, "ploup", True)
+
+    logger = Logger(logger_id="loggy_fast", path=Path("D:/log"), default_save=True, asynchronous=True,
+                    structured=True, max_bytes=1e6)
+    for i in range(0, 10000):
+        logger.log(2, f">{i}", rep=i)
+    logger.close()
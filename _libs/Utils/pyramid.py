@@ -0,0 +1,190 @@
+from pathlib import Path
+from typing import Dict, Tuple
+import math
+
+import numpy as np
+
+
+class MinMaxPyramid:
+    """Level of detail index of a waveform sampled at a constant rate, to plot millions of points quickly.
+
+    Level k holds the min and the max of each block of 2**k samples (level 0 being the waveform itself). It is built
+    once per capture, then a plot only pulls the level where the visible samples fit in the pixel width: drawing the
+    min and the max of each block keeps the envelope (peaks, glitches) that a plain decimation would miss.
+
+    >>>pyramid = MinMaxPyramid(volt, start=time[0], step=time[1] - time[0])
+    ...fig, ax = plt.subplots()
+    ...pyramid.plot(ax)  # Follows the zoom
+
+    The pyramids of a capture are saved next to it by the savers (see save_all and sidecar), and loaded by the plots
+    instead of being built again.
+    """
+
+    SUFFIX = ".lod.npz"
+
+    def __init__(self, data, start: float = 0., step: float = 1.):
+        """Build all the levels.
+
+        :param data: the samples
+        :param start: x of the first sample (ex. its time)
+        :param step: x between two samples (ex. the sampling period)
+        """
+        self.start = start
+        self.step = step
+        self.levels = [(np.asarray(data, dtype=float),) * 2]
+
+        mins, maxs = self.levels[0]
+        while len(mins) > 1:
+            if len(mins) % 2:
+                # The last block is shorter, its last sample is repeated
+                mins = np.append(mins, mins[-1])
+                maxs = np.append(maxs, maxs[-1])
+            mins = np.minimum(mins[0::2], mins[1::2])
+            maxs = np.maximum(maxs[0::2], maxs[1::2])
+            self.levels.append((mins, maxs))
+
+    def __len__(self) -> int:
+        return len(self.levels[0][0])
+
+    def level(self, width: int, first: int = 0, last: int = None) -> int:
+        """Find the most detailed level where the samples first to last fit in width blocks.
+
+        :param width: number of blocks available (ex. the pixel width of the plot)
+        :param first: index of the first sample
+        :param last: index after the last sample (None for the end)
+        :return: the level
+        """
+        last = len(self) if last is None else last
+        span = max(1, last - first)
+        return min(len(self.levels) - 1, max(0, math.ceil(math.log2(span / max(1, width)))))
+
+    def envelope(self, width: int, xmin: float = None, xmax: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the points to plot between xmin and xmax.
+
+        :param width: number of blocks wanted (ex. the pixel width of the plot)
+        :param xmin: first x to plot (None for the start)
+        :param xmax: last x to plot (None for the end)
+        :return: x and y, the min and the max of each block at its center, or the samples if they fit in width
+        """
+        first = 0 if xmin is None else int(max(0, (xmin - self.start) // self.step))
+        last = len(self) if xmax is None else int(min(len(self), math.ceil((xmax - self.start) / self.step) + 1))
+        last = max(first + 1, last)
+
+        level = self.level(width, first, last)
+        block = 2 ** level
+        mins, maxs = self.levels[level]
+        first, last = first // block, min(len(mins), -(-last // block))
+
+        x = self.start + (np.arange(first, last) * block + (block - 1) / 2) * self.step
+        if level == 0:
+            return x, mins[first:last]
+        return np.repeat(x, 2), np.column_stack((mins[first:last], maxs[first:last])).ravel()
+
+    def plot(self, ax, width: int = None, **kwargs):
+        """Plot the waveform on a matplotlib axis, and keep the level matched to the zoom.
+
+        :param ax: the axis
+        :param width: number of blocks (None for the pixel width of the axis)
+        :param kwargs: passed to ax.plot (ex. label, color)
+        :return: the line
+        """
+        line, = ax.plot(*self.envelope(width or self.__width(ax)), **kwargs)
+        self.attach(ax, line, width)
+        return line
+
+    def attach(self, ax, line, width: int = None):
+        """Refresh the points of a line from the pyramid each time the x limits of its axis change (zoom, pan).
+
+        :param ax: the axis
+        :param line: the line, plotted from this pyramid
+        :param width: number of blocks (None for the pixel width of the axis)
+        """
+        def update(axis):
+            line.set_data(*self.envelope(width or self.__width(axis), *axis.get_xlim()))
+
+        ax.callbacks.connect('xlim_changed', update)
+
+    def save(self, path: Path):
+        """Write the pyramid (all the levels) to a compressed .npz file."""
+        np.savez_compressed(path, **self.__arrays())
+
+    @staticmethod
+    def load(path: Path) -> 'MinMaxPyramid':
+        """Read a pyramid written by save, without computing the levels again."""
+        with np.load(path) as arrays:
+            return MinMaxPyramid.__from_arrays(arrays)
+
+    @staticmethod
+    def build_all(x, columns: Dict[str, list]) -> Dict[str, 'MinMaxPyramid']:
+        """Build the pyramids of several columns sampled on the same x (ex. the voltage and the current of a capture).
+
+        :param x: x of each sample (ex. the time), at a constant step
+        :param columns: the samples of each column, by name
+        :return: the pyramids, by name
+        """
+        step = (x[-1] - x[0]) / max(1, len(x) - 1) if len(x) else 1.
+        start = x[0] if len(x) else 0.
+        return {name: MinMaxPyramid(data, start, step) for name, data in columns.items()}
+
+    @staticmethod
+    def save_all(path: Path, pyramids: Dict[str, 'MinMaxPyramid']):
+        """Write several pyramids, by name, to one .npz file (see sidecar).
+        Not compressed: noisy samples hardly compress, and it is read back about five times faster.
+        """
+        arrays = {'names': np.array(list(pyramids), dtype=str)}
+        for i, pyramid in enumerate(pyramids.values()):
+            arrays.update(pyramid.__arrays(f'p{i}_'))
+        np.savez(path, **arrays)
+
+    @staticmethod
+    def load_all(path: Path) -> Dict[str, 'MinMaxPyramid']:
+        """Read the pyramids written by save_all.
+
+        :return: the pyramids, by name
+        """
+        with np.load(path) as arrays:
+            return {str(name): MinMaxPyramid.__from_arrays(arrays, f'p{i}_')
+                    for i, name in enumerate(arrays['names'])}
+
+    @staticmethod
+    def sidecar(path: Path) -> Path:
+        """Get the file of the pyramids stored with a capture (ex. D1_surge_60A_25C.csv -> D1_surge_60A_25C.lod.npz)."""
+        path = Path(path)
+        return path.with_name(path.stem + MinMaxPyramid.SUFFIX)
+
+    def __arrays(self, prefix: str = '') -> Dict[str, np.ndarray]:
+        arrays = {f'{prefix}start': self.start, f'{prefix}step': self.step, f'{prefix}data': self.levels[0][0]}
+        for k, (mins, maxs) in enumerate(self.levels[1:], 1):
+            arrays[f'{prefix}min{k}'] = mins
+            arrays[f'{prefix}max{k}'] = maxs
+        return arrays
+
+    @staticmethod
+    def __from_arrays(arrays, prefix: str = '') -> 'MinMaxPyramid':
+        pyramid = MinMaxPyramid([], float(arrays[f'{prefix}start']), float(arrays[f'{prefix}step']))
+        pyramid.levels = [(arrays[f'{prefix}data'],) * 2]
+        k = 1
+        while f'{prefix}min{k}' in arrays:
+            pyramid.levels.append((arrays[f'{prefix}min{k}'], arrays[f'{prefix}max{k}']))
+            k += 1
+        return pyramid
+
+    @staticmethod
+    def __width(ax) -> int:
+        return max(1, int(ax.bbox.width))
+
+
+if __name__ == "__main__":
+    import time as tme
+
+    t = np.arange(10_000_000) * 1e-9
+    v = np.sin(t * 2e6) + (np.arange(len(t)) == 5_000_000) * 3  # One sample glitch
+
+    start = tme.time()
+    pyramid = MinMaxPyramid(v, start=t[0], step=t[1] - t[0])
+    print(f"{len(pyramid.levels)} levels in {tme.time() - start:.3f}s")
+
+    x, y = pyramid.envelope(1000)
+    print(f"{len(x)} points, max {y.max()}")
+    x, y = pyramid.envelope(1000, 4e-3, 6e-3)
+    print(f"{len(x)} points between 4ms and 6ms, max {y.max()}")
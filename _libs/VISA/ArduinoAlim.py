@@ -1,5 +1,6 @@
 import Arduino.BuildArduino as BuildArduino
 from VISA.VISA_controller import VisaController
+from VISA.ramp import RampController
 
 
 class ArduinoAlim:
@@ -55,6 +56,11 @@ class ArduinoAlim:
             return int(self.__device.query(":MEAS:VOLT?"))
         except Exception as e:
             return -1
+
+    def ramp(self, **kwargs) -> RampController:
+        """Get a ramp controller of the output, stepped with the manual ramp (see RampController for the arguments)."""
+        kwargs.setdefault('tolerance', 2)  # The measure is in whole volts
+        return RampController(self.manu_rampe_voltage, self.voltage, **kwargs)
         
     def close(self):
         self.__device.close()
@@ -1,7 +1,9 @@
+from collections import namedtuple
 from enum import Enum
 from typing import TypeVar, List, Tuple
 import time as tme
 
+import numpy as np
 import visa
 
 
@@ -183,6 +185,19 @@ class DG4062:
         EXTERNAL = "EXT"
         MANUAL = "MAN"
 
+    # ###################### #
+    # ## Arbitrary tuples ## #
+    # ###################### #
+
+    PulseTable = namedtuple("PulseTable", ['pulses', 'low', 'starts', 'duration', 'sample_period', 'samples'])
+    PulseTable.__doc__ = """A schedule of pulses, compiled into one arbitrary waveform"""
+    PulseTable.pulses.__doc__ += """ : (high level (V), width (s)) of each pulse"""
+    PulseTable.low.__doc__ += """ : Level between the pulses (V)"""
+    PulseTable.starts.__doc__ += """ : Start of each pulse, from the trigger (s)"""
+    PulseTable.duration.__doc__ += """ : Duration of the whole table (s)"""
+    PulseTable.sample_period.__doc__ += """ : Time of one point of the waveform (s)"""
+    PulseTable.samples.__doc__ += """ : Points of the waveform, normalized from -1 (low) to 1 (highest pulse)"""
+
     @staticmethod
     # TODO: def __parse_enum(enum: Enum[EnumMember], s: str) -> EnumMember:
     def __parse_enum(enum, s: str):
@@ -206,6 +221,10 @@ class DG4062:
     # ############# #
 
     NAME = "DG4062"
+    ARB_POINTS = 16384  # Points of the volatile arbitrary waveform
+    ARB_MIN_POINTS = 8  # Minimum points of a pulse of a table
+    DAC_MAX = 16383  # 14 bits DAC, code of the highest level
+    DAC_CHUNK = 4096  # Points per binary transfer
 
     def __init__(self, instr):
         """Initialize the instrument.
@@ -321,11 +340,109 @@ class DG4062:
         """Get the source of the burst trigger for the specified channel."""
         return DG4062.__parse_enum(DG4062.TrigSources, self.__device.query(f":{chn.value}:BURS:TRIG:SOUR?"))
 
-    def chn_burst_trig(self, chn: Channels):
-        """Trigger a burst (manually)."""
-        self.set_chn_burst_trig(chn, DG4062.TrigSources.MANUAL)
+    def set_chn_burst_cycles(self, chn: Channels, cycles: int):
+        """Set the number of cycles of a burst for the specified channel."""
+        self.__device.write(f":{chn.value}:BURS:MODE TRIG")
+        self.__device.write(f":{chn.value}:BURS:NCYC {cycles}")
+
+    def chn_burst_trig(self, chn: Channels, manual: bool = True):
+        """Trigger a burst (manually).
+
+        :param manual: set the trigger source to MANUAL first, False if it is already set (saves a command)
+        """
+        if manual:
+            self.set_chn_burst_trig(chn, DG4062.TrigSources.MANUAL)
         self.__device.write(f":{chn.value}:BURS:TRIG")
 
+    # ## Arbitrary waveform related methods ## #
+    def upload_arb(self, chn: Channels, samples, binary: bool = True, chunk: int = None, verify: int = 8):
+        """Write an arbitrary waveform to the volatile memory of the specified channel, and check it.
+
+        In binary mode, the points are converted to DAC codes and sent as IEEE blocks of 16 bits little endian
+        integers, chunk by chunk (the last one flagged END): 2 bytes per point instead of about 8 characters in ASCII.
+
+        :param samples: the points, normalized from -1 to 1 (up to ARB_POINTS)
+        :param binary: use the binary DAC transfer, False for the ASCII list
+        :param chunk: points per binary transfer (None for DAC_CHUNK)
+        :param verify: number of points read back and compared, evenly spread (0 to only check the size)
+        :raise ValueError: too many points, or the generator did not get them right
+        """
+        samples = np.clip(np.asarray(samples, dtype=float), -1, 1)
+        if not 1 < len(samples) <= DG4062.ARB_POINTS:
+            raise ValueError(f"An arbitrary waveform has 2 to {DG4062.ARB_POINTS} points, not {len(samples)} !")
+        codes = np.round((samples + 1) / 2 * DG4062.DAC_MAX).astype('<u2')
+
+        if binary:
+            chunk = chunk or DG4062.DAC_CHUNK
+            for first in range(0, len(codes), chunk):
+                data = codes[first:first + chunk].tobytes()
+                flag = 'END' if first + chunk >= len(codes) else 'CON'
+                size = str(len(data))
+                self.__device.write_raw(f":{chn.value}:DATA:DAC VOLATILE,{flag},#{len(size)}{size}".encode() +
+                                        data + b"\n")
+        else:
+            self.__device.write(f":{chn.value}:DATA VOLATILE," + ",".join(f"{v:.4f}" for v in samples))
+
+        points = int(float(self.__device.query(f":{chn.value}:DATA:POIN? VOLATILE")))
+        if points != len(codes):
+            raise ValueError(f"Arbitrary waveform upload failed : {points} points instead of {len(codes)} !")
+
+        for index in np.unique(np.linspace(0, len(codes) - 1, verify).astype(int)) if verify else []:
+            value = int(float(self.__device.query(f":{chn.value}:DATA:VAL? VOLATILE,{index + 1}")))
+            if abs(value - int(codes[index])) > (0 if binary else 1):  # ASCII values are rounded to 4 decimals
+                raise ValueError(f"Arbitrary waveform upload failed : point {index + 1} is {value} "
+                                 f"instead of {codes[index]} !")
+
+    @staticmethod
+    def compile_pulse_table(pulses: List[Tuple[float, float]], low: float, gap: float,
+                            points: int = None) -> PulseTable:
+        """Compile a schedule of pulses into one arbitrary waveform.
+        The table starts with a gap, each pulse being followed by a gap at the low level.
+
+        :param pulses: (high level (V), width (s)) of each pulse
+        :param low: level between the pulses (V)
+        :param gap: time between two pulses (s), long enough for the rig (cooldown, scope rearm...)
+        :param points: points of the waveform (None for ARB_POINTS)
+        :return: the table
+        :raise ValueError: a pulse is too short for the resolution of the table (split it, or shorten the gap)
+        """
+        points = points or DG4062.ARB_POINTS
+        duration = gap + sum(width + gap for _, width in pulses)
+        sample_period = duration / points
+        shortest = min(width for _, width in pulses)
+        if shortest < DG4062.ARB_MIN_POINTS * sample_period:
+            raise ValueError(f"Pulses of {shortest}s are too short for a table of {duration}s "
+                             f"({sample_period}s per point) !")
+
+        top = max(low, *[high for high, _ in pulses])
+        samples = np.full(points, -1.)
+        starts = []
+        start = gap
+        for high, width in pulses:
+            starts.append(start)
+            first, last = round(start / sample_period), round((start + width) / sample_period)
+            samples[first:last] = 2 * (high - low) / (top - low) - 1 if top != low else -1
+            start += width + gap
+
+        return DG4062.PulseTable(list(pulses), low, starts, duration, sample_period, samples)
+
+    def load_pulse_table(self, chn: Channels, table: PulseTable, source: TrigSources = TrigSources.MANUAL):
+        """Upload a pulse table (binary transfer) and set the channel to play it once per trigger, so a whole sweep
+        of pulses needs no reconfiguration: only a trigger (chn_burst_trig(chn, manual=False) if MANUAL, or the
+        EXTERNAL input).
+
+        :param table: the table, from compile_pulse_table
+        :param source: trigger source of the table
+        """
+        self.upload_arb(chn, table.samples)
+        self.set_chn_shape(chn, DG4062.Shapes.USER)
+        self.set_chn_frequency(chn, 1 / table.duration)
+        top = max(table.low, *[high for high, _ in table.pulses])
+        self.set_chn_hi_lo(chn, top, table.low)
+        self.chn_burst(chn, True)
+        self.set_chn_burst_cycles(chn, 1)
+        self.set_chn_burst_trig(chn, source)
+
     # ################ #
     # ## Attributes ## #
     # ################ #
@@ -388,3 +505,10 @@ if __name__ == "__main__":
 
     print(dg.errors)
 
+    #  # Same pulses, uploaded once and played by one trigger #  #
+    table = DG4062.compile_pulse_table([(p, 300e-6) for p in pulses], low=-.1, gap=10e-3)
+    dg.load_pulse_table(CHN1, table)
+    dg.chn_burst_trig(CHN1, manual=False)
+
+    print(dg.errors)
+
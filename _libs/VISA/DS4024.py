@@ -1,9 +1,13 @@
+from collections import namedtuple
 from enum import Enum
-from typing import TypeVar, List, Tuple
+from typing import TypeVar, List, Tuple, Dict, Callable
 import time as tme
 
+import numpy as np
 import visa
 
+from VISA.buffers import BufferPool
+
 
 class DS4024:
     # ################# #
@@ -75,6 +79,27 @@ class DS4024:
         X500 = '500'
         X1000 = '1000'
 
+    class Measures(Enum):
+        """An enumeration of the automatic measurements of the scope (on the acquired waveform)."""
+        MAX = 'VMAX'
+        MIN = 'VMIN'
+        PEAK_PEAK = 'VPP'
+        TOP = 'VTOP'
+        BASE = 'VBAS'
+        AMPLITUDE = 'VAMP'
+        AVERAGE = 'VAVG'
+        RMS = 'VRMS'
+        OVERSHOOT = 'OVER'
+        PRESHOOT = 'PRES'
+        PERIOD = 'PER'
+        FREQUENCY = 'FREQ'
+        RISE_TIME = 'RTIM'
+        FALL_TIME = 'FTIM'
+        POSITIVE_WIDTH = 'PWID'
+        NEGATIVE_WIDTH = 'NWID'
+        POSITIVE_DUTY = 'PDUT'
+        NEGATIVE_DUTY = 'NDUT'
+
     class Errors(Enum):
         """An enumeration that describe the current status (errors) of the scope."""
         ERROR_SYSTEM_VOLTAGE = (0, "System voltage error")
@@ -89,6 +114,17 @@ class DS4024:
         ERROR_TEMPE2 = (13, "Temperature 2 error")
         ERROR_TMO = (16, "Timeout error")
 
+    Capture = namedtuple("Capture", ['time', 'data'])
+    Capture.__doc__ = """Waveform read into a pooled buffer"""
+    Capture.time.__doc__ += """ : Relative time of each sample (seconds, shared between captures, do not modify)"""
+    Capture.data.__doc__ += """ : Y values (units, view on the buffer)"""
+
+    Frames = namedtuple("Frames", ['time', 'data', 'timestamps'])
+    Frames.__doc__ = """Frames of a waveform record"""
+    Frames.time.__doc__ += """ : Relative time of each sample, same for all the frames (seconds, shape (samples,))"""
+    Frames.data.__doc__ += """ : Y values of each frame (units, shape (frames, samples))"""
+    Frames.timestamps.__doc__ += """ : Nominal start of each frame, from the first one (seconds, shape (frames,))"""
+
     @staticmethod
     # TODO: def __parse_enum(enum: Enum[EnumMember], s: str) -> EnumMember:
     def __parse_enum(enum, s: str):
@@ -123,6 +159,8 @@ class DS4024:
 
     NAME = "DS4024"
 
+    INVALID = 9.9e37  # Value returned by a measurement that can't be done
+
     def __init__(self, instr):
         """Initialize the instrument.
         More than one instrument can be instanced.
@@ -141,18 +179,11 @@ class DS4024:
         if DS4024.NAME not in self.__device.query("*IDN?"):
             raise TypeError("Instrument is not a DS4024 !")
 
-    def get_curve(self, chn: Channels, tmo: int = 5, custom_scale: float = 1) -> Tuple[List[float], List[float]]:
-        """Retrieve waveform data.
-        This method will start an acquisition of the current waveform,
-        and wait until all data is gathered or after the specified timeout.
-        A scaling can be applied to the y values.
-        This will leave the scope in a stopped state.
+        self.__time = None
+        self.__time_key = None
 
-        :param chn: the channel to retrieve.
-        :param tmo: timeout until abort waiting and start gathering data.
-        :param custom_scale: a scale that is applied to the y value.
-        :return: (relative time (seconds), y values (in units, like volts or amps)).
-        """
+    def __start_read(self, chn: Channels, tmo: int):
+        """Prepare a RAW waveform read of a channel, and wait until the scope is ready to send it."""
         self.__device.write(":STOP")  # This is needed
         m_dep = int(self.__device.query(":ACQ:MDEP?"))
 
@@ -180,6 +211,78 @@ class DS4024:
             ready |= (tries > tmo)
             m_depl = m_dep
 
+    def capture(self, chn: Channels, buffer: BufferPool.Buffer, tmo: int = 5, custom_scale: float = 1) -> Capture:
+        """Retrieve waveform data into a preallocated buffer (see BufferPool), like get_curve.
+        The IEEE block is read straight into the raw bytearray and scaled in place into the float array: no Python
+        list is created. The returned arrays are views on the buffer, valid until it is released. The time axis is
+        cached, it is only computed again when the depth or the time base changes.
+
+        :param chn: the channel to retrieve.
+        :param buffer: the buffer, large enough for the memory depth (ex. pool.acquire(ds.memory_depth)).
+        :param tmo: timeout until abort waiting and start gathering data.
+        :param custom_scale: a scale that is applied to the y value.
+        :return: the capture (time, y values), empty if the transfer failed.
+        :raise ValueError: if the buffer is smaller than the waveform (the waveform is read and dropped).
+        """
+        self.__start_read(chn, tmo)
+
+        # Retrieve data, IEEE block : #<number of digits><number of bytes><data>
+        raw = memoryview(buffer.raw)
+        try:
+            self.__device.write(":WAV:DATA?")
+            digits = int(self.__device.read_bytes(2)[1:2])
+            declared = int(self.__device.read_bytes(digits))
+            size = min(declared, len(raw))
+            read = 0
+            while read < declared:
+                chunk = self.__device.read_bytes(declared - read, break_on_termchar=False)
+                if read < size:
+                    raw[read:min(read + len(chunk), size)] = chunk[:size - read]
+                read += len(chunk)  # The tail of a block too large for the buffer is drained, not left in the stream
+            self.__device.read_bytes(1)  # Termination
+        except visa.VisaIOError as e:
+            print(e)
+            return DS4024.Capture(buffer.data[:0], buffer.data[:0])
+
+        # End
+        self.__device.write(":WAV:END")
+        if declared > len(raw):
+            raise ValueError(f"Buffer too small : {len(raw)} bytes for {declared} points")
+
+        # Y scaling values, read the doc ! (p. 251 of the programming manual)
+        scale = float(self.__device.query(':WAV:YINC?'))
+        ref = float(self.__device.query(':WAV:YREF?'))
+        offset = float(self.__device.query(':WAV:YOR?'))
+        inv = -1 if self.is_chn_invert(chn) else +1
+
+        data = buffer.data[:size]
+        np.subtract(np.frombuffer(buffer.raw, dtype=np.uint8, count=size), ref, out=data)
+        data *= inv * scale
+        data -= offset
+        data *= custom_scale
+
+        # X scaling values
+        key = (size, float(self.__device.query(':WAV:XINC?')), float(self.__device.query(':TIM:OFFS?')))
+        if self.__time_key != key:
+            self.__time = (np.arange(size) - size / 2) * key[1] + key[2]
+            self.__time_key = key
+
+        return DS4024.Capture(self.__time, data)
+
+    def get_curve(self, chn: Channels, tmo: int = 5, custom_scale: float = 1) -> Tuple[List[float], List[float]]:
+        """Retrieve waveform data.
+        This method will start an acquisition of the current waveform,
+        and wait until all data is gathered or after the specified timeout.
+        A scaling can be applied to the y values.
+        This will leave the scope in a stopped state.
+
+        :param chn: the channel to retrieve.
+        :param tmo: timeout until abort waiting and start gathering data.
+        :param custom_scale: a scale that is applied to the y value.
+        :return: (relative time (seconds), y values (in units, like volts or amps)).
+        """
+        self.__start_read(chn, tmo)
+
         # Retrieve data
         try:
             data = self.__device.query_binary_values(":WAV:DATA?", is_big_endian=False, datatype='B')
@@ -212,6 +315,98 @@ class DS4024:
 
         return scaled_time, scaled_data
 
+    def measure(self, item: Measures, chn: Channels, custom_scale: float = 1) -> float:
+        """Get an automatic measurement of the scope, only a few bytes are transferred.
+
+        :param item: the measurement.
+        :param chn: the measured channel.
+        :param custom_scale: a scale that is applied to the value (only for the vertical measurements).
+        :return: the value (in units, or seconds/Hz/% for the time measurements), None if the scope can't measure it.
+        """
+        value = float(self.__device.query(f":MEAS:{item.value}? {chn.value}"))
+        if abs(value) >= DS4024.INVALID:
+            return None
+        return value * custom_scale if item.value.startswith('V') else value
+
+    def measure_first(self, measures: Dict[str, Tuple[Measures, Channels, float]], keep: Callable[[Dict], bool],
+                      curves: Dict[str, Tuple[Channels, float]]) -> Tuple[Dict, Dict]:
+        """Decide from automatic measurements if the waveforms of an acquisition are worth transferring.
+        The scope must be stopped (acquisition done). The waveforms are only read if keep returns True, so a shot
+        that only needs a go/no-go verdict costs a few queries instead of the full memory depth.
+
+        :param measures: the measurements, by name : (measurement, channel, custom scale).
+        :param keep: called with the measured values (by name), True to transfer the waveforms.
+        :param curves: the waveforms, by name : (channel, custom scale).
+        :return: (measured values by name, waveforms by name as (time, y values), empty if not kept).
+        """
+        values = {name: self.measure(item, chn, scale) for name, (item, chn, scale) in measures.items()}
+        if not keep(values):
+            return values, {}
+
+        return values, {name: self.get_curve(chn, custom_scale=scale) for name, (chn, scale) in curves.items()}
+
+    def record(self, frames: int, interval: float = None):
+        """Record the next triggers into the scope memory (waveform record), one frame per trigger.
+        The scope must be set up (scales, trigger) before, the frames are retrieved by get_frames once recorded.
+
+        :param frames: number of frames to record (up to record_max_frames).
+        :param interval: minimal time between two frames (seconds, None to keep the current one).
+        """
+        self.__device.write(":FUNC:WREC:ENAB ON")
+        self.__device.write(f":FUNC:WREC:FEND {frames}")
+        if interval is not None:
+            self.__device.write(f":FUNC:WREC:FINT {interval}")
+        self.__device.write(":FUNC:WREC:OPER RUN")
+
+    def stop_record(self):
+        """Stop the waveform record, the frames already recorded are kept."""
+        self.__device.write(":FUNC:WREC:OPER STOP")
+
+    def get_frames(self, chn: Channels, first: int = 1, last: int = None, tmo: int = 5,
+                   custom_scale: float = 1) -> Frames:
+        """Retrieve recorded frames in one batch (waveform replay).
+        Each frame is read in RAW mode, the whole memory of the frame and not only the screen points.
+        Scaling values are read once, all the frames are recorded with the same settings.
+
+        :param chn: the channel to retrieve.
+        :param first: first frame to retrieve (starts at 1).
+        :param last: last frame to retrieve (None for the last recorded one, see recorded_frames).
+        :param tmo: timeout until abort waiting and start gathering the data of a frame.
+        :param custom_scale: a scale that is applied to the y value.
+        :return: the frames (time, (frames x samples) y values, timestamps).
+        """
+        if last is None:
+            last = self.recorded_frames
+
+        raw = []
+        for frame in range(first, last + 1):
+            self.__device.write(f":FUNC:WREP:FCUR {frame}")
+            self.__start_read(chn, tmo)
+            raw.append(self.__device.query_binary_values(":WAV:DATA?", is_big_endian=False, datatype='B',
+                                                         container=np.array))
+            self.__device.write(":WAV:END")
+
+        # Frames of a record have the same length, except if it has been cut by an error
+        size = min(len(r) for r in raw) if raw else 0
+        raw = np.stack([r[:size] for r in raw]) if raw else np.empty((0, 0))
+
+        # Y scaling values, read the doc ! (p. 251 of the programming manual)
+        scale = float(self.__device.query(':WAV:YINC?'))
+        ref = float(self.__device.query(':WAV:YREF?'))
+        offset = float(self.__device.query(':WAV:YOR?'))
+        inv = -1 if self.is_chn_invert(chn) else +1
+        data = (inv * (raw - ref) * scale - offset) * custom_scale
+
+        # X scaling values
+        scale = float(self.__device.query(':WAV:XINC?'))
+        off = float(self.__device.query(':TIM:OFFS?'))
+        time = (np.arange(size) - size / 2) * scale + off
+
+        interval = float(self.__device.query(":FUNC:WREC:FINT?"))
+        timestamps = np.arange(last - first + 1) * interval
+
+        return DS4024.Frames(time, data, timestamps)
+
     def chn_display(self, chn: Channels, dis: bool):
         """Display or not the specified channel."""
         self.__device.write(f":{chn.value}:DISP {1 if dis else 0}")
@@ -277,6 +472,11 @@ class DS4024:
         """Set the scope to 'STOP' or 'RUN'."""
         self.__device.write(f":{DS4024.Status.RUN.value if not stop else DS4024.Status.STOP.value}")
 
+    @property
+    def memory_depth(self) -> int:
+        """Get the memory depth (number of samples of a RAW waveform)."""
+        return int(self.__device.query(":ACQ:MDEP?"))
+
     @property
     def reading_status(self) -> Tuple[bool, int]:
         """Get the status of the started acquisition.
@@ -290,6 +490,22 @@ class DS4024:
 
         return ready, m_dep
 
+    # ## Waveform record attributes ## #
+    @property
+    def recording(self) -> bool:
+        """Check if a waveform record is running."""
+        return 'RUN' in self.__device.query(":FUNC:WREC:OPER?")
+
+    @property
+    def recorded_frames(self) -> int:
+        """Get the number of frames actually recorded by the last record (less than requested if stopped early)."""
+        return int(self.__device.query(":FUNC:WREP:FMAX?"))
+
+    @property
+    def record_max_frames(self) -> int:
+        """Get the maximum number of frames that can be recorded with the current settings."""
+        return int(self.__device.query(":FUNC:WREC:FMAX?"))
+
     # ## Time attributes ## #
     # Time scale
     @property
@@ -126,6 +126,11 @@ class MODEL2410:
 
     NAME = "MODEL 2410"
 
+    AUTOSCALE_MARGIN = 100  # Compliance / expected reading
+    AUTOSCALE_TOLERANCE = 10  # A compliance up to this times too large is kept (no retry)
+    AUTOSCALE_MIN = 1e-6  # Lowest compliance used by the autoscale
+    AUTOSCALE_MAX_RETRIES = 1  # Per point, so a point is never read more than twice
+
     def __init__(self, instr):
         """Initialize the instrument.
         More than one instrument can be instanced.
@@ -144,6 +149,8 @@ class MODEL2410:
         if MODEL2410.NAME not in self.__device.query("*IDN?"):
             raise TypeError("Instrument is not a Keithley 2410 !")
 
+        self.retries = 0  # Autoscale retries of the last sweep
+
     def v_source_wizard(self, volt: float, compliance: float):
         """Automatically configure the instrument in voltage source mode,
         with the specified voltage and current compliance.
@@ -233,7 +240,9 @@ class MODEL2410:
         :param x_step: Step x between Start and Stop (can be absolute)
         :param x_list: Custom x list that replace i_start, i_stop, and i_step
         :param settle_time: Delay between voltage change and reading
-        :param autoscale: If the measure is to low compared to the compliance, adjust the compliance and retry
+        :param autoscale: Predict the compliance of each point from the previous ones, and retry once if the measure
+                          is clipped or too low compared to the compliance (two reads at most per point). The number
+                          of retries is kept in retries.
         :return: a list of Data('voltage', 'current', 'resistance', 'timestamp', 'status')
         """
         self.output = False
@@ -247,20 +256,24 @@ class MODEL2410:
         x_source_wizard(0, y_compliance)
         x_source_wizard(x_list[0], y_compliance)
         self.output = True
+        self.retries = 0
         for i in x_list:
             reading = None
-            comp = y_compliance
+            comp = self.__predict_compliance(data, x_source_wizard, y_compliance) if autoscale else y_compliance
+            tries = 0
             while comp is not None:
                 x_source_wizard(i, comp)
                 if settle_time > 0:
                     tme.sleep(settle_time)
                 reading = self.read()[0]
 
-                # Doing at max two measure per data (only one retry)
-                if not autoscale or comp != y_compliance:
+                # Only retry on a misprediction, and at most AUTOSCALE_MAX_RETRIES times per data
+                tries += 1
+                if not autoscale or tries > MODEL2410.AUTOSCALE_MAX_RETRIES:
                     comp = None
                 else:
-                    comp = self.__good_reading(x_source_wizard, reading, y_compliance)
+                    comp = self.__good_reading(x_source_wizard, reading, comp, y_compliance)
+                    self.retries += comp is not None
 
             data.append(reading)
         self.output = False
@@ -269,13 +282,49 @@ class MODEL2410:
         return data
 
     @staticmethod
-    def __good_reading(x_source_wizard: Callable[[float, float], None], data: Data, compliance: float):
+    def __y_value(x_source_wizard: Callable[[float, float], None], data: Data) -> float:
         values = {MODEL2410.v_source_wizard.__name__: data.current,
                   MODEL2410.i_source_wizard.__name__: data.voltage}
 
-        value = abs(values.get(x_source_wizard.__name__) or 0) * 100
-        if value < compliance:
-            return max(value, 1e-6)
+        return abs(values.get(x_source_wizard.__name__) or 0)
+
+    @staticmethod
+    def __predict_compliance(data: List[Data], x_source_wizard: Callable[[float, float], None],
+                             compliance: float) -> float:
+        """Predict the compliance of the next point from the previous points of the sweep.
+        A rising y is extrapolated with the ratio of the two last points (exponential, like a diode in direct),
+        a falling one is not. The compliance is AUTOSCALE_MARGIN times the prediction, as for a retry.
+        """
+        if not data:
+            return compliance
+
+        last = MODEL2410.__y_value(x_source_wizard, data[-1])
+        predicted = last
+        if len(data) > 1:
+            previous = MODEL2410.__y_value(x_source_wizard, data[-2])
+            if 0 < previous < last:
+                predicted = last * (last / previous)
+
+        return min(compliance, max(predicted * MODEL2410.AUTOSCALE_MARGIN, MODEL2410.AUTOSCALE_MIN))
+
+    @staticmethod
+    def __good_reading(x_source_wizard: Callable[[float, float], None], data: Data, comp: float, compliance: float):
+        """Check a reading done with the compliance comp, and give the compliance of the retry (None if good).
+
+        :param comp: the compliance used for this reading
+        :param compliance: the maximum compliance of the sweep
+        """
+        value = MODEL2410.__y_value(x_source_wizard, data)
+
+        # Under-predicted: the reading is clipped by the compliance, retry with the maximum one
+        in_compliance = MODEL2410.Status.COMPLIANCE in data.status or MODEL2410.Status.RANGE_COMPLIANCE in data.status
+        if comp < compliance and (in_compliance or value >= comp * .99):
+            return compliance
+
+        # Over-predicted: the resolution is too poor, retry with a compliance fitted to the reading
+        ideal = max(value * MODEL2410.AUTOSCALE_MARGIN, MODEL2410.AUTOSCALE_MIN)
+        if ideal * MODEL2410.AUTOSCALE_TOLERANCE < comp:
+            return ideal
         return None
 
     def beep(self, freq: float, t: float, wait: bool = False):
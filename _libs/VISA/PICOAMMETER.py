@@ -99,6 +99,9 @@ class PICOAMMETER:
 
     NAME = "MODEL 6485"
 
+    RANGES = [2.1e-9, 2.1e-8, 2.1e-7, 2.1e-6, 2.1e-5, 2.1e-4, 2.1e-3, 2.1e-2]  # Full scale of each range (Amps)
+    OVERFLOW = 9.9e37  # Reading returned on over-range
+
     def __init__(self, instr):
         """Initialize the instrument.
         More than one instrument can be instanced.
@@ -117,6 +120,10 @@ class PICOAMMETER:
         if PICOAMMETER.NAME not in self.__device.query("*IDN?"):
             raise TypeError("Instrument is not a Keithley 6485 !")
 
+        self.__history = []
+        self.__range_index = None
+        self.overflows = 0
+
     def read(self) -> List[Data]:
         """Read a new value from the picoammeter.
 
@@ -130,6 +137,59 @@ class PICOAMMETER:
         data = [PICOAMMETER.Data(*x) for x in readings]  # Create data list
         return data
 
+    def reset_autorange(self, rng: float = None):
+        """Start a new sweep for predictive_read: forget the previous readings and the overflow count.
+
+        :param rng: the range of the first point (Amps, None for the lowest range)
+        """
+        self.__history = []
+        self.overflows = 0
+        index = 0 if rng is None else next((i for i, r in enumerate(PICOAMMETER.RANGES) if rng <= r),
+                                           len(PICOAMMETER.RANGES) - 1)
+        self.__set_range_index(index)
+
+    def predictive_read(self, headroom: float = .8, hysteresis: float = .5) -> Data:
+        """Read a sweep point, the range being chosen from the trend of the previous points of the sweep.
+        The next current is extrapolated from the two last readings when rising. The range goes up as soon as the
+        prediction is over headroom of the full scale, but only goes down when the prediction is well inside the lower
+        range (under headroom * hysteresis of its full scale), so it does not switch back and forth on noise.
+        If the reading overflows anyway, the range goes up and the point is read again (counted in overflows).
+
+        :param headroom: part of the full scale that may be used (between 0 and 1)
+        :param hysteresis: extra margin before ranging down (between 0 and 1)
+        :return: the reading, Data('current', 'timestamp', 'status')
+        """
+        if self.__range_index is None:
+            # First point, or the range was changed by hand
+            self.reset_autorange()
+
+        if self.__history:
+            last = abs(self.__history[-1])
+            # A rising trend is extrapolated, a falling one is not: going down too fast would overflow
+            predicted = last if len(self.__history) < 2 else max(last, 2 * last - abs(self.__history[-2]))
+
+            index = self.__range_index
+            while index < len(PICOAMMETER.RANGES) - 1 and predicted > PICOAMMETER.RANGES[index] * headroom:
+                index += 1
+            while index > 0 and predicted < PICOAMMETER.RANGES[index - 1] * headroom * hysteresis:
+                index -= 1
+            self.__set_range_index(index)
+
+        data = self.read()[0]
+        while (data.current >= PICOAMMETER.OVERFLOW or PICOAMMETER.Status.OVERFLOW in data.status) \
+                and self.__range_index < len(PICOAMMETER.RANGES) - 1:
+            self.overflows += 1
+            self.__set_range_index(self.__range_index + 1)
+            data = self.read()[0]
+
+        self.__history = self.__history[-1:] + [data.current]
+        return data
+
+    def __set_range_index(self, index: int):
+        if index != self.__range_index:
+            self.range = PICOAMMETER.RANGES[index]
+            self.__range_index = index
+
     # ################ #
     # ## Attributes ## #
     # ################ #
@@ -165,6 +225,17 @@ class PICOAMMETER:
     @range.setter
     def range(self, rng: float):
         self.__device.write(f":RANG {rng}")
+        self.__range_index = None
+
+    @property
+    def auto_range(self) -> bool:
+        """Check/Set the auto range of the instrument (see predictive_read for sweeps)."""
+        return self.__device.query(":RANG:AUTO?") == "1"
+
+    @auto_range.setter
+    def auto_range(self, auto: bool):
+        self.__device.write(f":RANG:AUTO {'1' if auto else '0'}")
+        self.__range_index = None
 
     @property
     def speed(self) -> Speed:
@@ -1,5 +1,6 @@
 import time
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple
 
 import visa
@@ -20,6 +21,7 @@ class VisaController:
     Identity.ver.__doc__ += """ : Version."""
 
     __instr_list = {}
+    __executors = {}
     __rm = None
     __query = None
 
@@ -45,6 +47,10 @@ class VisaController:
 
     @classmethod
     def __del__(cls):
+        for executor in cls.__executors.values():
+            executor.shutdown(wait=True)
+        cls.__executors = {}
+
         for res in cls.__instr_list:
             try:
                 cls.__instr_list[res].device.close()
@@ -124,6 +130,22 @@ class VisaController:
         """
         return [d for _, d in cls.__instr_list.items() if d.idn.name == name]
 
+    @classmethod
+    def get_pool(cls, driver: type, minimum: int = 1):
+        """Create a driver for each connected instrument of a model, and use them as a pool.
+
+        :param driver: the driver class (ex. PICOAMMETER), instruments are found by its NAME
+        :param minimum: minimum number of instruments
+        :return: an executor.InstrumentPool, the instruments ordered by serial number (the same order on every run)
+        :raise ValueError: "Not enough instruments !" : less than minimum instruments are connected.
+        """
+        from VISA.executor import InstrumentPool
+
+        instrs = sorted(cls.get_instruments_by_name(driver.NAME), key=lambda instr: instr.idn.sn)
+        if len(instrs) < minimum:
+            raise ValueError(f"Not enough instruments ! ({len(instrs)} {driver.NAME} < {minimum})")
+        return InstrumentPool([driver(instr) for instr in instrs], instrs)
+
     @classmethod
     def get_unchecked_resource(cls, res: str) -> pyvisa.resources.Resource:
         """Try to open the resource, without any checking or warranty, use at your own risk !
@@ -133,6 +155,21 @@ class VisaController:
         """
         return cls.__rm.open_resource(res)
 
+    @classmethod
+    def get_executor(cls, instr) -> ThreadPoolExecutor:
+        """Get the command queue of an instrument: a single worker thread, created on the first call.
+        All the commands submitted to it run in order, so drivers of different instruments can be used at the same
+        time without mixing the commands of one instrument. See executor.AsyncInstrument.
+
+        :param instr: the instrument (from get_instruments_by_name) or an unchecked resource
+        :return: the executor of this instrument, the same for every call
+        """
+        device = getattr(instr, 'device', instr)
+        key = getattr(device, 'resource_name', id(device))
+        if key not in cls.__executors:
+            cls.__executors[key] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=str(key))
+        return cls.__executors[key]
+
     @classmethod
     def get_resources_list(cls) -> Tuple[str]:
         """Get all the resource ids, to be used with get_unchecked_resource
@@ -1,3 +1,6 @@
+from VISA.ramp import RampController
+
+
 class XR8000:
     # ############# #
     # ## Methods ## #
@@ -38,25 +41,23 @@ class XR8000:
 
     def output_ramp(self, final_voltage: float, ramp_duration: float, step_time: float = 1):
         """Cancel the overshoot by slowly ramping up the voltage.
+        Each step lasts step_time, longer only if the output has not settled yet (up to the RampController timeout),
+        so the ramp lasts at least ramp_duration.
 
-        :param final_voltage:
-        :param ramp_duration:
+        :param final_voltage: voltage at the end of the ramp
+        :param ramp_duration: minimum duration of the ramp (number of steps = ramp_duration / step_time)
+        :param step_time: minimum time of a step
         """
-        import time
-
-        step_volt = final_voltage / (ramp_duration / step_time)
-
-        volt = 0
         self.voltage = 0
         self.output = True
-        time.sleep(1)
 
-        while volt < final_voltage:
-            volt += step_volt
-            self.voltage = volt
-            time.sleep(step_time)
+        ramp = self.ramp(dwell=step_time)
+        ramp.step(0)
+        ramp.ramp(0, final_voltage, round(ramp_duration / step_time))
 
-        self.voltage = final_voltage
+    def ramp(self, **kwargs) -> RampController:
+        """Get a ramp controller of the output (see RampController for the arguments)."""
+        return RampController(lambda v: setattr(self, 'voltage', v), lambda: self.voltage, **kwargs)
 
     # ################ #
     # ## Attributes ## #
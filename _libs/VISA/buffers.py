@@ -0,0 +1,50 @@
+from collections import namedtuple
+from queue import Queue
+
+import numpy as np
+
+
+class BufferPool:
+    """A few preallocated buffers, reused shot after shot so a capture loop allocates nothing.
+
+    A buffer is a raw bytearray (the transferred samples) and a float array (the scaled samples) of the same size.
+    It is taken with acquire and must be given back with release once its data is not used anymore (saved...).
+    If all the buffers are in use, acquire waits for one to be released.
+    """
+
+    Buffer = namedtuple('Buffer', ['raw', 'data'])
+    Buffer.__doc__ = """A pooled buffer"""
+    Buffer.raw.__doc__ += """ : Raw samples, as transferred (bytearray)"""
+    Buffer.data.__doc__ += """ : Scaled samples (numpy float64 array)"""
+
+    def __init__(self, size: int, count: int = 4):
+        """Allocate the buffers.
+
+        :param size: number of samples of each buffer (ex. the memory depth of the scope)
+        :param count: number of buffers
+        """
+        self.size = size
+        self.count = count
+        self.__free = Queue()
+        for _ in range(count):
+            self.__free.put(BufferPool.Buffer(bytearray(size), np.empty(size)))
+
+    def acquire(self, size: int = None) -> Buffer:
+        """Take a free buffer, waiting for one if needed.
+
+        :param size: number of samples needed, the buffer is reallocated if it is smaller (None for the pool size)
+        :return: the buffer
+        """
+        buffer = self.__free.get()
+        if size is not None and size > len(buffer.raw):
+            buffer = BufferPool.Buffer(bytearray(size), np.empty(size))
+        return buffer
+
+    def release(self, buffer: Buffer):
+        """Give a buffer back to the pool."""
+        self.__free.put(buffer)
+
+    @property
+    def available(self) -> int:
+        """Number of free buffers."""
+        return self.__free.qsize()
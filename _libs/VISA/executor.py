@@ -0,0 +1,152 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from queue import Queue
+from typing import Any, Callable, Iterator, List
+
+from VISA.VISA_controller import VisaController
+
+
+class AsyncInstrument:
+    """Run the commands of a driver in the worker of its instrument, and get futures back.
+
+    Every method of the driver can be called on this object, it returns a Future instead of the result.
+    Commands to one instrument run one after another, in the order they were submitted (one worker per instrument,
+    see VisaController.get_executor), while commands to different instruments run at the same time.
+
+    >>>ds = AsyncInstrument(DS4024(inst_ds), inst_ds)
+    ...k2410 = AsyncInstrument(MODEL2410(inst_k), inst_k)
+    ...gather(ds.set_chn_scale(ds.Channels.CHANNEL1, 1), k2410.v_source_wizard(50, 10e-3))
+    """
+
+    def __init__(self, driver, instr):
+        """Attach a driver to the worker of its instrument.
+
+        :param driver: the driver (ex. DS4024(instr))
+        :param instr: the value returned by VisaController.get_instruments_by_name(...) for this driver,
+                      or an unchecked resource
+        """
+        self.driver = driver
+        self.__executor = VisaController.get_executor(instr)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.driver, name)
+        if not callable(attr) or isinstance(attr, type):
+            # Enums and constants of the driver
+            return attr
+
+        def submit(*args, **kwargs) -> Future:
+            return self.__executor.submit(attr, *args, **kwargs)
+
+        return submit
+
+    def submit(self, function: Callable, *args, **kwargs) -> Future:
+        """Run a function in the worker of the instrument, the driver being the first argument.
+
+        :param function: the function, like a lambda doing several commands that must not be interleaved
+        :return: the future of the function result
+        """
+        return self.__executor.submit(function, self.driver, *args, **kwargs)
+
+    def set(self, name: str, value) -> Future:
+        """Set an attribute of the driver (ex. set('time_scale', 1e-3)).
+
+        :return: a future, done when the attribute is written
+        """
+        return self.__executor.submit(setattr, self.driver, name, value)
+
+    def get(self, name: str) -> Future:
+        """Read an attribute of the driver (ex. get('stopped')).
+
+        :return: the future of the value
+        """
+        return self.__executor.submit(getattr, self.driver, name)
+
+
+def gather(*futures: Future, timeout: float = None) -> List:
+    """Wait for futures and get their results, in the same order.
+
+    :param futures: the futures, from one or more instruments
+    :param timeout: maximum time to wait (seconds, None for no limit)
+    :return: the results
+    :raise Exception: the exception of the first command that failed
+    """
+    done, _ = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+    for future in done:
+        if future.exception() is not None:
+            raise future.exception()
+    return [future.result(timeout=0) for future in futures]
+
+
+class InstrumentPool:
+    """Several instruments of the same model, used as one.
+
+    Work is spread over the instruments: map gives each item to the first free instrument, and batches cuts a list
+    in groups of at most one item per instrument, each item going to the instrument it is assigned to, to be measured
+    at the same time.
+    """
+
+    def __init__(self, drivers: List, instrs: List):
+        """Attach each driver to the worker of its instrument.
+
+        :param drivers: the drivers, one per instrument
+        :param instrs: the instruments (from VisaController.get_instruments_by_name), same order
+        """
+        self.drivers = list(drivers)
+        self.members = [AsyncInstrument(d, i) for d, i in zip(drivers, instrs)]
+
+    def __len__(self) -> int:
+        return len(self.drivers)
+
+    def __iter__(self):
+        return iter(self.drivers)
+
+    def all(self, name: str, *args, **kwargs) -> List:
+        """Call a method on every instrument at the same time, and wait for them.
+
+        :param name: name of the method (ex. 'predictive_read')
+        :return: the results, one per instrument
+        """
+        return gather(*[getattr(member, name)(*args, **kwargs) for member in self.members])
+
+    def set_all(self, name: str, value):
+        """Set an attribute of every instrument (ex. set_all('zero_check', False))."""
+        gather(*[member.set(name, value) for member in self.members])
+
+    def map(self, function: Callable, items: List) -> List:
+        """Run function(driver, item) for each item, each one on the first free instrument.
+
+        :param function: the work to do with one instrument
+        :param items: the items (ex. diodes)
+        :return: the results, in the order of the items
+        """
+        free = Queue()
+        for member in self.members:
+            free.put(member)
+
+        def run(item):
+            member = free.get()
+            try:
+                return member.submit(function, item).result()
+            finally:
+                free.put(member)
+
+        with ThreadPoolExecutor(max_workers=len(self.members)) as executor:
+            return list(executor.map(run, items))
+
+    def batches(self, items: List, assign: Callable[[Any], int]) -> Iterator[List]:
+        """Cut items in groups to be measured at the same time, with at most one item per instrument.
+
+        :param items: the items (ex. diodes)
+        :param assign: gives the index of the instrument of an item (ex. the picoammeter wired to a diode)
+        :return: groups of len(self) slots, the n-th slot holding the item of the n-th instrument, or None when this
+                 instrument has nothing to measure in the group
+        :raise IndexError: "No instrument ..." : an item is assigned to an instrument that is not in the pool.
+        """
+        queues = [[] for _ in self.members]
+        for item in items:
+            index = assign(item)
+            if not 0 <= index < len(queues):
+                raise IndexError(f"No instrument {index} for {item} ! ({len(queues)} in the pool)")
+            queues[index].append(item)
+
+        for i in range(max((len(queue) for queue in queues), default=0)):
+            yield [queue[i] if i < len(queue) else None for queue in queues]
@@ -0,0 +1,127 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+import time as tme
+
+
+class RampController:
+    """Step the output of a supply, moving on as soon as the measured voltage has settled.
+
+    The controller only needs a way to set the output and a way to read it back, so it is shared by all the supplies
+    (see XR8000.ramp and ArduinoAlim.ramp). Instead of a fixed sleep, each step polls the measured voltage until it
+    is within tolerance of the setpoint for a few consecutive readings, or until the timeout.
+    A step also lasts at least dwell, which limits the slew rate (step size / dwell) of a slow ramp against the
+    overshoot.
+    The measure of a sweep (ex. the picoammeter) is triggered on the first reading within tolerance once settle has
+    elapsed since the setpoint (ex. the charging current of the capacitances has died out), while the following
+    readings confirm the settling. It is only done again if the confirmation fails.
+    """
+
+    Point = namedtuple('Point', ['setpoint', 'voltage', 'settle_time', 'settled', 'reading'])
+    Point.__doc__ = """A step of a sweep"""
+    Point.setpoint.__doc__ += """ : Requested voltage (V)"""
+    Point.voltage.__doc__ += """ : Last measured voltage, once settled (V)"""
+    Point.settle_time.__doc__ += """ : Time from the setpoint to the settling (s)"""
+    Point.settled.__doc__ += """ : False if the timeout was reached first (bool)"""
+    Point.reading.__doc__ += """ : Result of the measure function, None if there is none"""
+
+    def __init__(self, set_voltage: Callable[[float], None], read_voltage: Callable[[], float], *,
+                 tolerance: float = 1, relative: float = .01, stable: int = 2, poll: float = .02,
+                 timeout: float = 2, dwell: float = 0, settle: float = 0):
+        """Initialize the controller.
+
+        :param set_voltage: function setting the output voltage (V)
+        :param read_voltage: function measuring the output voltage (V), None or negative on a failed reading
+        :param tolerance: absolute tolerance (V)
+        :param relative: tolerance relative to the setpoint, the largest of both is used
+        :param stable: number of consecutive readings within tolerance needed
+        :param poll: delay between two readings (s)
+        :param timeout: maximum time to wait for a step (s)
+        :param dwell: minimum time of a step (s)
+        :param settle: minimum time between the setpoint and the measure (s)
+        """
+        self.set_voltage = set_voltage
+        self.read_voltage = read_voltage
+        self.tolerance = tolerance
+        self.relative = relative
+        self.stable = stable
+        self.poll = poll
+        self.timeout = timeout
+        self.dwell = dwell
+        self.settle = settle
+
+    def step(self, setpoint: float, timeout: float = None, measure: Callable = None) -> Point:
+        """Set the output and wait until it settles, for at least dwell.
+
+        :param setpoint: the voltage (V)
+        :param timeout: maximum time to wait (s, None for the controller timeout), never shorter than dwell
+        :param measure: function called once settled and after settle, interleaved with the settling confirmation
+                        (None for none)
+        :return: the Point
+        """
+        timeout = max(self.dwell, self.timeout if timeout is None else timeout)
+        tolerance = max(self.tolerance, abs(setpoint) * self.relative)
+
+        start = tme.time()
+        self.set_voltage(setpoint)
+
+        count = 0
+        voltage = None
+        settle_time = None
+        pending = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while True:
+                voltage = self.read_voltage()
+                elapsed = tme.time() - start
+                valid = voltage is not None and voltage >= 0
+                count = count + 1 if valid and abs(voltage - setpoint) <= tolerance else 0
+                if count == 0:
+                    settle_time = None
+                elif count >= self.stable and settle_time is None:
+                    settle_time = elapsed
+
+                if measure is not None:
+                    if count == 0 and pending is not None:
+                        # Moved out of tolerance, this measure is not good
+                        pending.result()
+                        pending = None
+                    elif count > 0 and pending is None and elapsed >= self.settle:
+                        pending = executor.submit(measure)
+
+                settled = settle_time is not None
+                done = settled and elapsed >= self.dwell and (measure is None or pending is not None)
+                if done or elapsed >= timeout:
+                    reading = None
+                    if measure is not None:
+                        if pending is None:
+                            tme.sleep(max(0., self.settle - (tme.time() - start)))
+                            pending = executor.submit(measure)
+                        reading = pending.result()
+                    return RampController.Point(setpoint, voltage, elapsed if settle_time is None else settle_time,
+                                                settled, reading)
+                tme.sleep(self.poll)
+
+    def sweep(self, setpoints: Iterable[float], measure: Callable = None) -> Iterator[Point]:
+        """Go through the setpoints, and measure at each one as soon as the output has settled (and after settle).
+
+        :param setpoints: the voltages (V)
+        :param measure: function called at each step (ex. pico.predictive_read), None to only step
+        :return: an iterator of Point, so each point can be used before the next step
+        """
+        for setpoint in setpoints:
+            yield self.step(setpoint, measure=measure)
+
+    def ramp(self, start: float, stop: float, steps: int, timeout: float = None) -> Point:
+        """Go from start to stop in equal steps, each one waiting for the output to settle, and for at least dwell.
+
+        :param start: first voltage (V)
+        :param stop: last voltage (V)
+        :param steps: number of steps
+        :param timeout: maximum time to wait for each step (s, None for the controller timeout)
+        :return: the last Point
+        """
+        point = None
+        steps = max(1, int(steps))
+        for i in range(1, steps + 1):
+            point = self.step(start + (stop - start) * i / steps, timeout)
+        return point
@@ -17,6 +17,8 @@ import sys
 sys.path.insert(0, os.path.abspath('../Arduino'))
 sys.path.insert(0, os.path.abspath('../VISA'))
 sys.path.insert(0, os.path.abspath('../Utils'))
+sys.path.insert(0, os.path.abspath('../Recipe'))
+sys.path.insert(0, os.path.abspath('../Archive'))
 
 
 # -- Project information -----------------------------------------------------